@@ -1,25 +1,312 @@
 
-from flask import Flask, jsonify, request
+import time
+
+# Import time of this module and everything it pulls in (reported by /api/ready;
+# for a per-module breakdown run: python -X importtime -c "import app")
+_import_started = time.perf_counter()
+
+from flask import Flask, current_app, jsonify, request
 from flask_cors import CORS
-from config import SQLALCHEMY_DATABASE_URI, SQLALCHEMY_TRACK_MODIFICATIONS
-from models import db, Sector, Metric, SectorMetric, Company, CompanyMetric, Score
+import queue
+from collections import defaultdict
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+from config import (SQLALCHEMY_DATABASE_URI, SQLALCHEMY_TRACK_MODIFICATIONS, COMPRESS_MIN_SIZE, REFERENCE_CACHE_TTL,
+                    RESPONSE_CACHE_SIZE, ARTIFACTS_DIR, EVENTS_KEEPALIVE, DB_STATEMENT_TIMEOUT_MS)
+from models import (db, Company, CompanyMetric, Score, WeightProfile, RankSensitivity, MetricDistribution,
+                    ScoreComponent, RankMovement, ScoreDistribution, ReferenceCache, reference_data)
+from artifacts import send_artifact
+from compression import init_compression
+from db_pool import engine_options, pool_stats, track_pool
+from events import EventBroker, format_sse
+from queries import (LIST_FIELDS, LEADERBOARD_FIELDS, split_fields, profile_query, latest_run_query,
+                     generation_query, global_leaderboard_query, global_leaderboard_results, sector_leaderboard_query,
+                     sector_leaderboard_results)
+from response_cache import ResponseCache
+from scoring import ABSOLUTE_METRICS, normalize_value, percentile_scores
+from warmup import Warmup
 import logging
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_app():
+# Most companies /api/companies?ids= returns in one request
+MAX_BATCH_IDS = 100
+
+# Most risers/fallers the movers endpoints return per list
+MAX_MOVERS = 50
+
+
+def parse_fields(allowed):
+    """
+    Parse the optional comma-separated `fields` query param.
+    Returns (fields, error); fields is None when the param is absent.
+    """
+    return split_fields(request.args.get("fields", ""), allowed)
+
+
+def parse_ids():
+    """
+    Parse the optional comma-separated `ids` query param (company ids).
+    Returns (ids, error); ids is None when the param is absent.
+    """
+    raw = request.args.get("ids")
+    if raw is None:
+        return None, None
+    
+    try:
+        ids = list(dict.fromkeys(int(i) for i in raw.split(",") if i.strip()))
+    except ValueError:
+        return None, "Query parameter 'ids' must be comma-separated integers"
+    
+    if not ids:
+        return None, "Query parameter 'ids' is empty"
+    if len(ids) > MAX_BATCH_IDS:
+        return None, f"At most {MAX_BATCH_IDS} ids per request"
+    
+    return ids, None
+
+
+def resolve_profile():
+    """
+    Look up the optional `profile` query param (a weighting profile name).
+    Returns (profile, error); profile is None when the param is absent.
+    """
+    name = request.args.get("profile", "").strip()
+    if not name:
+        return None, None
+    
+    profile = db.session.execute(profile_query(name)).scalar()
+    if not profile:
+        return None, f"Unknown profile: {name}"
+    
+    return profile, None
+
+
+# Parsed sorted arrays of metric_distributions rows, one per metric and scope
+# (replaced in place when a scoring run rewrites the row):
+# {(metric_id, sector_id): (computed_at, numpy array)}
+_distribution_cache = {}
+
+
+def load_sorted_values(metric_id, sector_id=None):
+    """
+    Sorted comparison values for a percentile-mode metric in a sector (or
+    globally), or None if the scorer has not stored any. Only the row's id and
+    timestamp are read per call; the array itself is fetched and parsed again
+    only after a scoring run replaces it.
+    """
+    row = db.session.query(MetricDistribution.distribution_id, MetricDistribution.computed_at).filter(
+        MetricDistribution.metric_id == metric_id,
+        MetricDistribution.sector_id.is_(None) if sector_id is None else MetricDistribution.sector_id == sector_id
+    ).first()
+    if not row:
+        return None
+    
+    key = (metric_id, sector_id)
+    cached = _distribution_cache.get(key)
+    if cached and cached[0] == row.computed_at:
+        return cached[1]
+    
+    sorted_values = np.asarray(
+        db.session.query(MetricDistribution.sorted_values).filter_by(distribution_id=row.distribution_id).scalar(),
+        dtype=float
+    )
+    _distribution_cache[key] = (row.computed_at, sorted_values)
+    return sorted_values
+
+
+def global_leaderboard(limit, fields=LEADERBOARD_FIELDS, profile=None):
+    """Top `limit` companies by sector score, serialized with their rank"""
+    rows = db.session.execute(global_leaderboard_query(limit, fields, profile)).all()
+    return global_leaderboard_results(rows, fields)
+
+
+def movers(limit, sector_id=None):
+    """
+    Top risers and fallers of the latest scoring run: by sector rank within
+    `sector_id`, or by overall rank. Reads the rank_movements rows written at
+    publication (indexed on the rank change).
+    """
+    latest = db.session.query(
+        RankMovement.run_id, RankMovement.previous_run_id, RankMovement.computed_at
+    ).first()
+    
+    if sector_id is None:
+        change = RankMovement.overall_rank_change
+        query = RankMovement.query
+    else:
+        change = RankMovement.sector_rank_change
+        query = RankMovement.query.filter(RankMovement.sector_id == sector_id)
+    query = query.options(joinedload(RankMovement.company))
+    
+    risers = query.filter(change > 0).order_by(change.desc(), RankMovement.company_id).limit(limit).all()
+    fallers = query.filter(change < 0).order_by(change.asc(), RankMovement.company_id).limit(limit).all()
+    
+    return {
+        'run_id': latest.run_id if latest else None,
+        'previous_run_id': latest.previous_run_id if latest else None,
+        'computed_at': latest.computed_at.isoformat() if latest and latest.computed_at else None,
+        'risers': [m.to_dict() for m in risers],
+        'fallers': [m.to_dict() for m in fallers]
+    }
+
+
+def distribution_body(sector_id=None):
+    """
+    JSON body of the precomputed distributions of one sector (or of all
+    companies): sector scores, global scores and each metric's normalized values
+    """
+    rows = ScoreDistribution.query.filter(
+        ScoreDistribution.sector_id == sector_id if sector_id is not None else ScoreDistribution.sector_id.is_(None)
+    ).order_by(ScoreDistribution.metric_id).all()
+    
+    ref = reference_data()
+    result = {
+        'run_id': rows[0].run_id if rows else None,
+        'computed_at': rows[0].computed_at.isoformat() if rows and rows[0].computed_at else None,
+        'sector_score': None,
+        'global_score': None,
+        'metrics': []
+    }
+    if sector_id is not None:
+        result = {'sector_id': sector_id, 'sector_name': ref.sector_name(sector_id), **result}
+    
+    for row in rows:
+        if row.subject == 'metric':
+            metric = ref.metrics.get(row.metric_id, {})
+            result['metrics'].append({
+                'metric_id': row.metric_id,
+                'metric_name': metric.get('metric_name'),
+                'unit': metric.get('unit'),
+                **row.to_dict()
+            })
+        else:
+            result[row.subject] = row.to_dict()
+    
+    return current_app.json.dumps(result).encode()
+
+
+def overall_stats():
+    """Counts of companies, sectors, metrics and scores, and the last score update"""
+    stats = {
+        'total_companies': Company.query.count(),
+        'total_sectors': len(reference_data().sectors),
+        'total_metrics': len(reference_data().metrics),
+        'companies_scored': Score.query.count(),
+        'last_updated': db.session.query(Score.last_calculated).order_by(
+            Score.last_calculated.desc()
+        ).first()
+    }
+    
+    # Convert datetime to string
+    if stats['last_updated']:
+        stats['last_updated'] = stats['last_updated'][0].isoformat()
+    
+    return stats
+
+
+def companies_detailed(company_ids):
+    """
+    Detailed records (metrics included) for several companies, in the order
+    given, using two queries regardless of how many ids are requested.
+    Returns (records, ids not found).
+    """
+    companies = {
+        c.company_id: c
+        for c in Company.query.filter(Company.company_id.in_(company_ids)).options(joinedload(Company.score))
+    }
+    
+    company_metrics = defaultdict(list)
+    if companies:
+        for cm in CompanyMetric.query.filter(CompanyMetric.company_id.in_(list(companies))).order_by(CompanyMetric.id):
+            company_metrics[cm.company_id].append(cm)
+    
+    records = [companies[cid].to_dict_detailed(company_metrics[cid]) for cid in company_ids if cid in companies]
+    not_found = [cid for cid in company_ids if cid not in companies]
+    return records, not_found
+
+
+def bootstrap_body(limit):
+    """
+    JSON body of the dashboard bundle: sectors, metrics, stats and the top
+    `limit` of the leaderboard
+    """
+    ref = reference_data()
+    return current_app.json.dumps({
+        'sectors': list(ref.sectors.values()),
+        'metrics': list(ref.metrics.values()),
+        'stats': overall_stats(),
+        'leaderboard': global_leaderboard(limit)
+    }).encode()
+
+
+def cached_response(key, build):
+    """
+    Serve a JSON body from the app's response cache, with its ETag (304 if the
+    client already has it). Bodies are rebuilt only when a new scoring run is
+    published, companies are re-imported or the reference data is reloaded;
+    concurrent requests for the same key share one rebuild (see
+    response_cache.py). build() returns the body bytes.
+    """
+    generation = (tuple(db.session.execute(generation_query()).one()), reference_data())
+    entry = current_app.extensions['response_cache'].get(key, generation, build)
+    
+    response = current_app.response_class(entry.body, mimetype='application/json')
+    response.set_etag(entry.etag)
+    return response.make_conditional(request)
+
+
+def create_app(config=None):
+    """
+    Build the Flask app. `config` optionally overrides settings from config.py
+    (e.g. SQLALCHEMY_DATABASE_URI for a local stand-in database, or
+    DB_STATEMENT_TIMEOUT_MS=0 for batch scripts).
+    """
     app = Flask(__name__)
     app.config["SQLALCHEMY_DATABASE_URI"] = SQLALCHEMY_DATABASE_URI
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = SQLALCHEMY_TRACK_MODIFICATIONS
+    app.config["COMPRESS_MIN_SIZE"] = COMPRESS_MIN_SIZE
+    app.config["REFERENCE_CACHE_TTL"] = REFERENCE_CACHE_TTL
+    app.config["RESPONSE_CACHE_SIZE"] = RESPONSE_CACHE_SIZE
+    app.config["ARTIFACTS_DIR"] = ARTIFACTS_DIR
+    app.config["EVENTS_KEEPALIVE"] = EVENTS_KEEPALIVE
+    app.config["DB_STATEMENT_TIMEOUT_MS"] = DB_STATEMENT_TIMEOUT_MS
+    
+    if config:
+        app.config.update(config)
+    
+    # Explicit pool sizing and statement timeout (Postgres only)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(
+        app.config["SQLALCHEMY_DATABASE_URI"], app.config["DB_STATEMENT_TIMEOUT_MS"]
+    ))
     
     # Enable CORS for frontend
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    CORS(app, resources={r"/api/*": {"origins": "*"}, r"/artifacts/*": {"origins": "*"}})
+    
+    # Compress large JSON responses (gzip/brotli/zstd)
+    init_compression(app)
     
     # Initialize database
     db.init_app(app)
     
+    # Sectors, metrics and weights are served from memory (see models.ReferenceCache).
+    # Load them now so the first requests don't pay for it; if the database
+    # isn't ready yet they are loaded on first use instead.
+    app.extensions['reference_cache'] = ReferenceCache(app.config["REFERENCE_CACHE_TTL"])
+    app.extensions['response_cache'] = ResponseCache(app.config["RESPONSE_CACHE_SIZE"])
+    app.extensions['event_broker'] = EventBroker(app)
+    app.extensions['warmup'] = Warmup(app, IMPORT_SECONDS)
+    with app.app_context():
+        track_pool(db.engine)
+        try:
+            reference_data()
+        except Exception as e:
+            logger.warning(f"Reference data not preloaded: {e}")
+            db.session.rollback()
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -37,8 +324,7 @@ def create_app():
     def get_sectors():
         """Get all sectors"""
         try:
-            sectors = Sector.query.all()
-            return jsonify([s.to_dict() for s in sectors])
+            return jsonify(list(reference_data().sectors.values()))
         except Exception as e:
             logger.error(f"Error fetching sectors: {e}")
             return jsonify({"error": str(e)}), 500
@@ -47,12 +333,13 @@ def create_app():
     def get_sector(sector_id):
         """Get single sector with its metrics"""
         try:
-            sector = Sector.query.get_or_404(sector_id)
-            result = sector.to_dict()
+            ref = reference_data()
+            sector = ref.sectors.get(sector_id)
+            if not sector:
+                return jsonify({"error": "Resource not found"}), 404
             
             # Add metrics for this sector
-            sector_metrics = SectorMetric.query.filter_by(sector_id=sector_id).all()
-            result['metrics'] = [sm.to_dict() for sm in sector_metrics]
+            result = dict(sector, metrics=ref.sector_metrics.get(sector_id, []))
             
             return jsonify(result)
         except Exception as e:
@@ -61,43 +348,78 @@ def create_app():
     
     @app.route("/api/sectors/<int:sector_id>/leaderboard", methods=["GET"])
     def get_sector_leaderboard(sector_id):
-        """Get ranked companies within a sector"""
+        """
+        Get ranked companies within a sector.
+        Query params:
+        - fields: Comma-separated company fields to return
+        - profile: Weighting profile name (default: base sector weights)
+        """
         try:
-            # Verify sector exists
-            sector = Sector.query.get_or_404(sector_id)
-            
-            # Get all companies in sector with scores
-            companies = Company.query.filter_by(sector_id=sector_id).all()
+            fields, error = parse_fields(LIST_FIELDS)
+            if error:
+                return jsonify({"error": error}), 400
             
-            results = []
-            for comp in companies:
-                data = comp.to_dict(include_score=True)
-                results.append(data)
+            profile, error = resolve_profile()
+            if error:
+                return jsonify({"error": error}), 404
             
-            # Sort by sector_score descending
-            results.sort(key=lambda x: x.get('sector_score') or 0, reverse=True)
+            # Verify sector exists
+            if sector_id not in reference_data().sectors:
+                return jsonify({"error": "Resource not found"}), 404
             
-            # Add rank
-            for i, company in enumerate(results, 1):
-                company['rank'] = i
+            def build():
+                # All companies in sector with scores, sorted by sector_score descending
+                rows = db.session.execute(sector_leaderboard_query(sector_id, fields, profile)).all()
+                return current_app.json.dumps(sector_leaderboard_results(sector_id, rows, fields, profile)).encode()
             
-            return jsonify({
-                'sector_id': sector_id,
-                'sector_name': sector.sector_name,
-                'companies': results
-            })
+            key = ('sector_leaderboard', sector_id, tuple(fields or ()), profile.profile_name if profile else None)
+            return cached_response(key, build)
         except Exception as e:
             logger.error(f"Error fetching leaderboard for sector {sector_id}: {e}")
             return jsonify({"error": str(e)}), 500
     
+    @app.route("/api/sectors/<int:sector_id>/distribution", methods=["GET"])
+    def get_sector_distribution(sector_id):
+        """
+        Quantiles, mean and histogram of the sector's sector scores, global
+        scores and per-metric normalized values, as of the last scoring run
+        """
+        try:
+            if sector_id not in reference_data().sectors:
+                return jsonify({"error": "Resource not found"}), 404
+            
+            return cached_response(('distribution', sector_id), lambda: distribution_body(sector_id))
+        except Exception as e:
+            logger.error(f"Error fetching distribution for sector {sector_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/sectors/<int:sector_id>/movers", methods=["GET"])
+    def get_sector_movers(sector_id):
+        """
+        Biggest sector-rank moves in a sector since the previous scoring run.
+        Query params:
+        - limit: Risers and fallers to return (default 5, max 50)
+        """
+        try:
+            if sector_id not in reference_data().sectors:
+                return jsonify({"error": "Resource not found"}), 404
+            
+            limit = max(1, min(request.args.get("limit", type=int, default=5), MAX_MOVERS))
+            result = movers(limit, sector_id)
+            result['sector_id'] = sector_id
+            result['sector_name'] = reference_data().sector_name(sector_id)
+            return jsonify(result)
+        except Exception as e:
+            logger.error(f"Error fetching movers for sector {sector_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
     # ===== METRICS ENDPOINTS =====
     
     @app.route("/api/metrics", methods=["GET"])
     def get_metrics():
         """Get all metrics"""
         try:
-            metrics = Metric.query.all()
-            return jsonify([m.to_dict() for m in metrics])
+            return jsonify(list(reference_data().metrics.values()))
         except Exception as e:
             logger.error(f"Error fetching metrics: {e}")
             return jsonify({"error": str(e)}), 500
@@ -106,12 +428,59 @@ def create_app():
     def get_metric(metric_id):
         """Get single metric"""
         try:
-            metric = Metric.query.get_or_404(metric_id)
-            return jsonify(metric.to_dict())
+            metric = reference_data().metrics.get(metric_id)
+            if not metric:
+                return jsonify({"error": "Resource not found"}), 404
+            return jsonify(metric)
         except Exception as e:
             logger.error(f"Error fetching metric {metric_id}: {e}")
             return jsonify({"error": str(e)}), 500
     
+    @app.route("/api/metrics/<int:metric_id>/percentile", methods=["GET"])
+    def get_metric_percentile(metric_id):
+        """
+        Percentile of a hypothetical value against a percentile-mode metric's
+        comparison set, and the metric score it would get.
+        Query params:
+        - value: Raw metric value (required)
+        - sector_id: Compare within this sector (default: global comparison set)
+        - turnover: Company turnover in £ billions (required for absolute metrics)
+        """
+        try:
+            value = request.args.get("value", type=float)
+            if value is None:
+                return jsonify({"error": "Query parameter 'value' must be a number"}), 400
+            
+            sector_id = request.args.get("sector_id", type=int)
+            turnover = request.args.get("turnover", type=float)
+            if metric_id in ABSOLUTE_METRICS and not (turnover and turnover > 0):
+                return jsonify({"error": "Query parameter 'turnover' is required for this metric"}), 400
+            
+            metric = reference_data().metrics.get(metric_id)
+            if not metric:
+                return jsonify({"error": "Metric not found"}), 404
+            
+            sorted_values = load_sorted_values(metric_id, sector_id)
+            if sorted_values is None:
+                return jsonify({"error": "No percentile distribution for this metric and scope"}), 404
+            
+            normalized = normalize_value(metric_id, value, turnover)
+            
+            return jsonify({
+                'metric_id': metric_id,
+                'metric_name': metric['metric_name'],
+                'scope': 'sector' if sector_id else 'global',
+                'sector_id': sector_id,
+                'value': value,
+                'normalized_value': normalized,
+                'sample_size': len(sorted_values),
+                'percentile': float(percentile_scores([normalized], sorted_values)[0]),
+                'score': float(percentile_scores([normalized], sorted_values, bool(metric['invert_score']))[0])
+            })
+        except Exception as e:
+            logger.error(f"Error computing percentile for metric {metric_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
     # ===== COMPANIES ENDPOINTS =====
     
     @app.route("/api/companies", methods=["GET"])
@@ -122,8 +491,26 @@ def create_app():
         - sector_id: Filter by sector
         - limit: Limit results
         - offset: Pagination offset
+        - fields: Comma-separated company fields to return
+        - ids: Comma-separated company ids; returns their detailed records
+          (as /api/companies/<id>) instead, and ignores the other params
         """
         try:
+            ids, error = parse_ids()
+            if error:
+                return jsonify({"error": error}), 400
+            if ids:
+                results, not_found = companies_detailed(ids)
+                return jsonify({
+                    'total': len(results),
+                    'companies': results,
+                    'not_found': not_found
+                })
+            
+            fields, error = parse_fields(LIST_FIELDS)
+            if error:
+                return jsonify({"error": error}), 400
+            
             # Build query
             query = Company.query
             
@@ -140,9 +527,9 @@ def create_app():
             total = query.count()
             
             # Get paginated results
-            companies = query.limit(limit).offset(offset).all()
+            companies = query.options(*Company.query_options(fields)).limit(limit).offset(offset).all()
             
-            results = [c.to_dict(include_score=True) for c in companies]
+            results = [c.to_dict(include_score=True, fields=fields) for c in companies]
             
             return jsonify({
                 'total': total,
@@ -164,6 +551,99 @@ def create_app():
             logger.error(f"Error fetching company {company_id}: {e}")
             return jsonify({"error": str(e)}), 500
     
+    @app.route("/api/companies/<int:company_id>/sensitivity", methods=["GET"])
+    def get_company_sensitivity(company_id):
+        """Get the company's rank distribution under weight perturbations"""
+        try:
+            sensitivity = RankSensitivity.query.filter_by(company_id=company_id).first()
+            if not sensitivity:
+                return jsonify({"error": "No sensitivity analysis for this company"}), 404
+            return jsonify(sensitivity.to_dict())
+        except Exception as e:
+            logger.error(f"Error fetching sensitivity for company {company_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/companies/<int:company_id>/breakdown", methods=["GET"])
+    def get_company_breakdown(company_id):
+        """
+        Per-metric breakdown of the company's sector score, as stored by the
+        last scoring run: normalized value, z-score, 0-100 score, weight and
+        contribution of each metric. Contributions sum to the sector score.
+        """
+        try:
+            rows = db.session.query(ScoreComponent, Company.sector_id).join(
+                Company, Company.company_id == ScoreComponent.company_id
+            ).filter(ScoreComponent.company_id == company_id).order_by(ScoreComponent.metric_id).all()
+            
+            if not rows:
+                return jsonify({"error": "No score breakdown for this company"}), 404
+            
+            ref = reference_data()
+            sector_id = rows[0].sector_id
+            
+            components = []
+            for component, _ in rows:
+                metric = ref.metrics.get(component.metric_id, {})
+                components.append({
+                    'metric_id': component.metric_id,
+                    'metric_name': metric.get('metric_name'),
+                    'unit': metric.get('unit'),
+                    'scoring_mode': metric.get('scoring_mode'),
+                    'invert_score': metric.get('invert_score'),
+                    'normalized_value': float(component.normalized_value) if component.normalized_value is not None else None,
+                    'z_score': float(component.z_score) if component.z_score is not None else None,
+                    'metric_score': float(component.metric_score) if component.metric_score is not None else None,
+                    'weight': float(component.weight) if component.weight is not None else None,
+                    'contribution': float(component.contribution) if component.contribution is not None else None
+                })
+            
+            # Share of the weight among the metrics the company was scored on
+            weight_total = sum(c['weight'] or 0.0 for c in components)
+            for c in components:
+                c['weight_share'] = (c['weight'] or 0.0) / weight_total if weight_total > 0 else None
+            
+            scored = {c['metric_id'] for c in components}
+            missing = [
+                {
+                    'metric_id': sm['metric_id'],
+                    'metric_name': ref.metrics.get(sm['metric_id'], {}).get('metric_name'),
+                    'weight': sm['weight']
+                }
+                for sm in ref.sector_metrics.get(sector_id, []) if sm['metric_id'] not in scored
+            ]
+            
+            contributions = [c['contribution'] for c in components if c['contribution'] is not None]
+            last_calculated = rows[0][0].last_calculated
+            
+            return jsonify({
+                'company_id': company_id,
+                'sector_id': sector_id,
+                'sector_name': ref.sector_name(sector_id),
+                'sector_score': sum(contributions) if contributions else None,
+                'last_calculated': last_calculated.isoformat() if last_calculated else None,
+                'components': components,
+                'missing_metrics': missing
+            })
+        except Exception as e:
+            logger.error(f"Error fetching score breakdown for company {company_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/companies/<int:company_id>/movement", methods=["GET"])
+    def get_company_movement(company_id):
+        """Get the company's rank and score change since the previous scoring run"""
+        try:
+            movement = RankMovement.query.filter_by(company_id=company_id).first()
+            if not movement:
+                return jsonify({"error": "No rank movement for this company"}), 404
+            
+            result = movement.to_dict()
+            result['run_id'] = movement.run_id
+            result['previous_run_id'] = movement.previous_run_id
+            return jsonify(result)
+        except Exception as e:
+            logger.error(f"Error fetching rank movement for company {company_id}: {e}")
+            return jsonify({"error": str(e)}), 500
+    
     @app.route("/api/companies/search", methods=["GET"])
     def search_companies():
         """
@@ -221,66 +701,175 @@ def create_app():
     
     @app.route("/api/leaderboard", methods=["GET"])
     def get_global_leaderboard():
-        """Get global leaderboard across all sectors"""
+        """
+        Get global leaderboard across all sectors.
+        Query params:
+        - limit: Limit results
+        - fields: Comma-separated leaderboard fields to return
+        - profile: Weighting profile name (default: base sector weights)
+        """
         try:
+            fields, error = parse_fields(LEADERBOARD_FIELDS)
+            if error:
+                return jsonify({"error": error}), 400
+            fields = fields or LEADERBOARD_FIELDS
+            
+            profile, error = resolve_profile()
+            if error:
+                return jsonify({"error": error}), 404
+            
             limit = request.args.get("limit", type=int, default=290)
             
-            # Get top scores with company info
-            scores = Score.query.order_by(Score.sector_score.desc()).limit(limit).all()
-            
-            results = []
-            for i, score in enumerate(scores, 1):
-                company = Company.query.get(score.company_id)
-                result = {
-                    'rank': i,
-                    'company_id': company.company_id,
-                    'name': company.name,
-                    'sector_id': company.sector_id,
-                    'sector_name': company.sector.sector_name if company.sector else None,
-                    'sector_score': float(score.sector_score) if score.sector_score else None,
-                    'global_score': float(score.global_score) if score.global_score else None,
-                    'turnover': float(company.turnover) if company.turnover else None
-                }
-                results.append(result)
+            def build():
+                return current_app.json.dumps(global_leaderboard(limit, fields, profile)).encode()
             
-            return jsonify(results)
+            key = ('leaderboard', limit, tuple(fields), profile.profile_name if profile else None)
+            return cached_response(key, build)
         except Exception as e:
             logger.error(f"Error fetching leaderboard: {e}")
             return jsonify({"error": str(e)}), 500
     
+    @app.route("/api/movers", methods=["GET"])
+    def get_movers():
+        """
+        Biggest overall-rank moves since the previous scoring run.
+        Query params:
+        - limit: Risers and fallers to return (default 5, max 50)
+        """
+        try:
+            limit = max(1, min(request.args.get("limit", type=int, default=5), MAX_MOVERS))
+            return jsonify(movers(limit))
+        except Exception as e:
+            logger.error(f"Error fetching movers: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/profiles", methods=["GET"])
+    def get_profiles():
+        """Get all weighting profiles"""
+        try:
+            profiles = WeightProfile.query.order_by(WeightProfile.profile_id).all()
+            return jsonify([p.to_dict() for p in profiles])
+        except Exception as e:
+            logger.error(f"Error fetching profiles: {e}")
+            return jsonify({"error": str(e)}), 500
+    
     # ===== STATS ENDPOINTS =====
     
+    @app.route("/api/bootstrap", methods=["GET"])
+    def get_bootstrap():
+        """
+        Everything the dashboard needs for its first paint in one response:
+        sectors, metrics, stats and the top of the global leaderboard.
+        Query params:
+        - limit: Leaderboard rows to include (default 10, max 290)
+        """
+        try:
+            limit = max(1, min(request.args.get("limit", type=int, default=10), 290))
+            return cached_response(('bootstrap', limit), lambda: bootstrap_body(limit))
+        except Exception as e:
+            logger.error(f"Error building bootstrap bundle: {e}")
+            return jsonify({"error": str(e)}), 500
+    
+    @app.route("/api/distribution", methods=["GET"])
+    def get_distribution():
+        """Same as /api/sectors/<id>/distribution, across all companies"""
+        try:
+            return cached_response(('distribution', None), distribution_body)
+        except Exception as e:
+            logger.error(f"Error fetching distribution: {e}")
+            return jsonify({"error": str(e)}), 500
+    
     @app.route("/api/stats", methods=["GET"])
     def get_stats():
         """Get overall statistics"""
         try:
-            stats = {
-                'total_companies': Company.query.count(),
-                'total_sectors': Sector.query.count(),
-                'total_metrics': Metric.query.count(),
-                'companies_scored': Score.query.count(),
-                'last_updated': db.session.query(Score.last_calculated).order_by(
-                    Score.last_calculated.desc()
-                ).first()
-            }
-            
-            # Convert datetime to string
-            if stats['last_updated']:
-                stats['last_updated'] = stats['last_updated'][0].isoformat()
-            
-            return jsonify(stats)
+            return jsonify(overall_stats())
         except Exception as e:
             logger.error(f"Error fetching stats: {e}")
             return jsonify({"error": str(e)}), 500
     
+    # ===== EVENTS =====
+    
+    @app.route("/api/events", methods=["GET"])
+    def get_events():
+        """
+        Server-sent events: a `generation` event with the latest scoring run id
+        on connect (skipped if it matches Last-Event-ID), then one each time a
+        run is published. Clients refetch only when the run id changes.
+        """
+        try:
+            run_id = db.session.execute(latest_run_query()).scalar()
+        except Exception as e:
+            logger.error(f"Error opening event stream: {e}")
+            return jsonify({"error": str(e)}), 500
+        
+        broker = app.extensions['event_broker']
+        last_event_id = request.headers.get('Last-Event-ID')
+        keepalive = app.config["EVENTS_KEEPALIVE"]
+        events = queue.Queue(maxsize=16)
+        
+        def deliver(event):
+            # A client too slow to keep up misses intermediate runs; the next
+            # event still carries the latest run id
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                pass
+        
+        def stream():
+            broker.subscribe(deliver)
+            try:
+                yield "retry: 5000\n\n"
+                
+                # A run published between the query above and subscribing
+                latest = broker.last_event
+                if latest and run_id is not None and latest['run_id'] > run_id:
+                    deliver(latest)
+                elif str(run_id) != last_event_id:
+                    yield format_sse({'run_id': run_id}, 'generation', run_id)
+                
+                while True:
+                    try:
+                        event = events.get(timeout=keepalive)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield format_sse(event, 'generation', event['run_id'])
+            finally:
+                broker.unsubscribe(deliver)
+        
+        return app.response_class(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # don't let nginx buffer the stream
+        })
+    
+    # ===== STATIC ARTIFACTS =====
+    
+    @app.route("/artifacts/<path:filename>", methods=["GET"])
+    def get_artifact(filename):
+        """
+        Serve a leaderboard artifact written by compute_scores.py (artifacts.py),
+        with the same headers a static file server / CDN should use
+        """
+        return send_artifact(app.config["ARTIFACTS_DIR"], filename, request.accept_encodings)
+    
     # ===== HEALTH CHECK =====
     
+    @app.route("/api/pool", methods=["GET"])
+    def get_pool_stats():
+        """Database connection pool usage for this process"""
+        try:
+            return jsonify({'sync': pool_stats(db.engine)})
+        except Exception as e:
+            logger.error(f"Error fetching pool stats: {e}")
+            return jsonify({"error": str(e)}), 500
+    
     @app.route("/api/health", methods=["GET"])
     def health_check():
         """Health check endpoint"""
         try:
             # Test database connection
-            db.session.execute('SELECT 1')
+            db.session.execute(text('SELECT 1'))
             return jsonify({
                 'status': 'healthy',
                 'database': 'connected'
@@ -292,6 +881,18 @@ def create_app():
                 'error': str(e)
             }), 500
     
+    @app.route("/api/ready", methods=["GET"])
+    def readiness_check():
+        """
+        Readiness probe: 503 until this process has warmed up (connection pool,
+        reference data, hot leaderboards; see warmup.py), then 200. Starts the
+        warm-up if it hasn't run, and retries it if it failed.
+        """
+        warmup = app.extensions['warmup']
+        if warmup.status in ('pending', 'failed'):
+            warmup.start()
+        return jsonify(warmup.to_dict()), 200 if warmup.status == 'ready' else 503
+    
     @app.route("/", methods=["GET"])
     def index():
         """API root"""
@@ -303,6 +904,11 @@ def create_app():
                 'metrics': '/api/metrics',
                 'companies': '/api/companies',
                 'leaderboard': '/api/leaderboard',
+                'profiles': '/api/profiles',
+                'bootstrap': '/api/bootstrap',
+                'events': '/api/events',
+                'pool': '/api/pool',
+                'ready': '/api/ready',
                 'stats': '/api/stats',
                 'health': '/api/health'
             }
@@ -310,6 +916,9 @@ def create_app():
     
     return app
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     app = create_app()
+    app.extensions['warmup'].start()
     app.run(debug=True, host='0.0.0.0', port=5000)
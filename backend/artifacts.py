@@ -0,0 +1,172 @@
+"""
+Static leaderboard artifacts for a static file server or CDN
+
+Leaderboards only change when a scoring run is published, so compute_scores.py
+writes them out as JSON files right after publishing; clients can then read
+them without reaching Flask or Postgres. Files in ARTIFACTS_DIR:
+
+    manifest.json                   the current run's files (revalidate: no-cache)
+    leaderboard.<hash>.json         same body as GET /api/leaderboard
+    leaderboard-<n>.<hash>.json     the same rows in pages of ARTIFACT_PAGE_SIZE
+    sector-<id>.<hash>.json         same body as GET /api/sectors/<id>/leaderboard
+    <file>.gz / .br / .zst          precompressed copies (br/zst if installed)
+
+Names include a hash of the content, so a file never changes once written and
+can be served with Cache-Control: immutable. Rows come in the leaderboard
+queries' total order (ties broken by company id), so rebuilding from the same
+data writes the same names. Clients read manifest.json first.
+Files of the previous manifest are kept so clients holding it can finish;
+older ones are removed.
+
+Usage (rebuild for the latest published run):
+    python artifacts.py
+    python artifacts.py --output-dir /var/www/greenrank/artifacts
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from flask import current_app, send_from_directory
+from werkzeug.exceptions import NotFound
+
+from compression import available_encodings, compress, MAX_LEVELS
+from config import ARTIFACTS_DIR, ARTIFACT_PAGE_SIZE
+from models import db, reference_data
+from queries import (latest_run_query, global_leaderboard_query, global_leaderboard_results, sector_leaderboard_query,
+                     sector_leaderboard_results)
+
+MANIFEST = 'manifest.json'
+
+# File suffix of each precompressed copy
+ENCODING_SUFFIXES = {'zstd': '.zst', 'br': '.br', 'gzip': '.gz'}
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+
+def write_file(path, data):
+    """Write bytes atomically, so readers never see a partial file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_artifact(output_dir, stem, payload):
+    """
+    Serialize payload to <stem>.<hash>.json plus its precompressed copies.
+    Returns the manifest entry for it.
+    """
+    body = current_app.json.dumps(payload).encode()
+    name = f"{stem}.{hashlib.sha256(body).hexdigest()[:16]}.json"
+    encodings = available_encodings()
+
+    # Same content, same name: already written by an earlier run
+    if not os.path.exists(os.path.join(output_dir, name)):
+        for encoding in encodings:
+            write_file(os.path.join(output_dir, name + ENCODING_SUFFIXES[encoding]),
+                       compress(body, encoding, MAX_LEVELS[encoding]))
+        write_file(os.path.join(output_dir, name), body)
+
+    return {'path': name, 'bytes': len(body), 'encodings': encodings}
+
+
+def manifest_files(manifest):
+    """Every file a manifest refers to, precompressed copies included"""
+    entries = [manifest['leaderboard']] + manifest['pages'] + list(manifest['sectors'].values())
+    return {
+        entry['path'] + suffix
+        for entry in entries
+        for suffix in [''] + [ENCODING_SUFFIXES[e] for e in entry['encodings']]
+    }
+
+
+def read_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def publish_artifacts(output_dir=ARTIFACTS_DIR, page_size=ARTIFACT_PAGE_SIZE):
+    """
+    Write the artifacts of the latest published run and point manifest.json
+    at them. Returns the manifest.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = read_manifest(output_dir)
+    run_id = db.session.execute(latest_run_query()).scalar()
+
+    # Global leaderboard: every scored company, then the same rows in pages
+    rows = global_leaderboard_results(db.session.execute(global_leaderboard_query(None)).all())
+    pages = [rows[i:i + page_size] for i in range(0, len(rows), page_size)]
+
+    manifest = {
+        'run_id': run_id,
+        'generated_at': datetime.utcnow().isoformat(),
+        'total_companies': len(rows),
+        'page_size': page_size,
+        'leaderboard': write_artifact(output_dir, 'leaderboard', rows),
+        'pages': [write_artifact(output_dir, f"leaderboard-{n}", page) for n, page in enumerate(pages, 1)],
+        'sectors': {}
+    }
+
+    for sector_id in reference_data().sectors:
+        sector_rows = db.session.execute(sector_leaderboard_query(sector_id)).all()
+        manifest['sectors'][str(sector_id)] = write_artifact(
+            output_dir, f"sector-{sector_id}", sector_leaderboard_results(sector_id, sector_rows)
+        )
+
+    write_file(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2).encode())
+
+    # Remove artifacts that neither this manifest nor the previous one uses
+    keep = manifest_files(manifest) | (manifest_files(previous) if previous else set())
+    removed = 0
+    for name in os.listdir(output_dir):
+        if name.startswith(('leaderboard', 'sector-')) and name not in keep:
+            os.remove(os.path.join(output_dir, name))
+            removed += 1
+
+    print(f"Wrote artifacts for run {run_id} to {output_dir}: {len(manifest_files(manifest))} files "
+          f"({len(pages)} leaderboard pages, {len(manifest['sectors'])} sectors), removed {removed} old files")
+    return manifest
+
+
+def send_artifact(directory, filename, accept_encodings):
+    """
+    Response for an artifact file with the cache headers a static server
+    should use, picking a precompressed copy the client accepts. The copies
+    themselves are only served that way: requested by name they would go out
+    as plain JSON without a Content-Encoding, so they are 404.
+    """
+    if filename.endswith(tuple(ENCODING_SUFFIXES.values())):
+        raise NotFound()
+
+    encodings = [e for e in available_encodings()
+                 if os.path.isfile(os.path.join(directory, filename + ENCODING_SUFFIXES[e]))]
+    encoding = accept_encodings.best_match(encodings) if encodings else None
+
+    response = send_from_directory(directory, filename + ENCODING_SUFFIXES.get(encoding, ''),
+                                   mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = REVALIDATE if filename == MANIFEST else IMMUTABLE
+    return response
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Write static leaderboard artifacts for the latest scoring run")
+    parser.add_argument('--output-dir', default=ARTIFACTS_DIR, help="Directory to write to (default: ARTIFACTS_DIR)")
+    parser.add_argument('--page-size', type=int, default=ARTIFACT_PAGE_SIZE, help="Rows per leaderboard page")
+    args = parser.parse_args()
+
+    app = create_app({'DB_STATEMENT_TIMEOUT_MS': 0})  # batch job: no API statement timeout
+    with app.app_context():
+        publish_artifacts(args.output_dir, args.page_size)
@@ -0,0 +1,381 @@
+"""
+Async (ASGI) serving mode for the GreenRank API
+
+Serves the read-heavy routes natively on an event loop, through an async
+driver (asyncpg) and an explicitly sized connection pool. Thousands of
+concurrent leaderboard readers then share a few connections instead of each
+holding a sync worker. Every other /api/* route is passed to the Flask app
+through asgiref's WSGI adapter (run in a thread pool), so both modes expose
+the same API.
+
+Native routes use the same query builders and serializers as the Flask routes
+(queries.py), and leaderboard bodies go through the same single-flight,
+stale-while-revalidate response cache (response_cache.py). Pool sizes and the
+statement timeout come from config.py; a statement that hits the timeout
+returns 503.
+
+Usage:
+    pip install starlette asgiref asyncpg greenlet uvicorn
+    uvicorn asgi:create_asgi_app --factory --host 0.0.0.0 --port 5000 --workers 4
+
+Served natively:
+    /api/leaderboard, /api/sectors/<id>/leaderboard, /api/events, /api/health, /api/pool
+
+/api/events streams are coroutines here rather than a thread each, so idle
+subscribers cost almost nothing.
+"""
+
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app import create_app
+from compression import negotiate
+from config import ASYNC_DATABASE_URI
+from db_pool import async_database_uri, async_engine_options, is_statement_timeout, pool_stats, track_pool
+from events import format_sse
+from models import db, reference_data
+from queries import (LIST_FIELDS, LEADERBOARD_FIELDS, split_fields, profile_query, latest_run_query,
+                     generation_query, global_leaderboard_query, global_leaderboard_results, sector_leaderboard_query,
+                     sector_leaderboard_results)
+from response_cache import AsyncResponseCache
+from warmup import hot_urls
+
+logger = logging.getLogger(__name__)
+
+
+def int_param(request, name, default=None):
+    """Integer query param, or `default` if absent or not an integer (like Flask's type=int)"""
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def resolve_profile(session, request):
+    """
+    Async counterpart of app.resolve_profile.
+    Returns (profile, error); profile is None when the param is absent.
+    """
+    name = request.query_params.get("profile", "").strip()
+    if not name:
+        return None, None
+
+    profile = (await session.execute(profile_query(name))).scalar()
+    if not profile:
+        return None, f"Unknown profile: {name}"
+
+    return profile, None
+
+
+def async_pool_size(engine):
+    """Connections an AsyncEngine's pool keeps open (1 for pools without a size)"""
+    size = getattr(engine.pool, 'size', None)
+    return size() if callable(size) else 1
+
+
+async def asgi_get(app, path, query=''):
+    """GET path from an ASGI app in-process, discarding the body. Returns the status code."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [], 'client': None, 'server': ('localhost', 80),
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+def create_asgi_app(flask_app=None, database_uri=None):
+    """
+    Build the ASGI app. `flask_app` serves the routes that aren't native
+    (default: app.create_app()); `database_uri` overrides the async database
+    (default: ASYNC_DATABASE_URI, or the Flask app's URI with an async driver).
+    """
+    flask_app = flask_app or create_app()
+    database_uri = database_uri or ASYNC_DATABASE_URI or async_database_uri(
+        flask_app.config["SQLALCHEMY_DATABASE_URI"])
+
+    response_cache = AsyncResponseCache(flask_app.config["RESPONSE_CACHE_SIZE"])
+
+    def json_response(request, payload, status_code=200, body=None, etag=None):
+        """
+        JSON response serialized and compressed like the Flask app's. Pass an
+        already serialized `body` (and its `etag`) instead of a payload to
+        serve a cached one; a matching If-None-Match returns 304.
+        """
+        body = body if body is not None else flask_app.json.dumps(payload).encode()
+        headers = {'Access-Control-Allow-Origin': '*', 'Vary': 'Accept-Encoding'}
+
+        if etag:
+            headers['ETag'] = f'"{etag}"'
+            if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+                return Response(None, 304, headers)
+
+        if 200 <= status_code < 300:
+            accept_encodings = parse_accept_header(request.headers.get('accept-encoding', ''))
+            body, encoding = negotiate(body, accept_encodings, flask_app.config["COMPRESS_MIN_SIZE"])
+            if encoding:
+                headers['Content-Encoding'] = encoding
+                if etag:
+                    headers['ETag'] = f'W/"{etag}"'
+
+        return Response(body, status_code, headers, media_type='application/json')
+
+    def handle_errors(description):
+        """Log failures like the Flask routes; cancelled (timed out) statements return 503"""
+        def decorator(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(request):
+                try:
+                    return await endpoint(request)
+                except DBAPIError as e:
+                    if is_statement_timeout(e):
+                        logger.warning(f"Statement timeout {description}")
+                        return json_response(request, {"error": "Query timed out"}, 503)
+                    logger.error(f"Error {description}: {e}")
+                    return json_response(request, {"error": str(e)}, 500)
+                except Exception as e:
+                    logger.error(f"Error {description}: {e}")
+                    return json_response(request, {"error": str(e)}, 500)
+            return wrapper
+        return decorator
+
+    def load_reference_data():
+        with flask_app.app_context():
+            reference_data()
+
+    async def reference_ready():
+        """
+        Refresh the reference-data cache off the event loop if it's due a
+        check, so serializers never block on the database
+        """
+        if not flask_app.extensions['reference_cache'].is_fresh():
+            await run_in_threadpool(load_reference_data)
+
+    async def cached_response(request, session, key, build):
+        """
+        Counterpart of app.cached_response: serve the body for `key` from the
+        response cache, rebuilt once per scoring run / company import /
+        reference-data reload. build() is awaited and returns the body bytes.
+        """
+        data_generation = tuple((await session.execute(generation_query())).one())
+        await reference_ready()
+        with flask_app.app_context():
+            generation = (data_generation, reference_data())
+
+        entry = await response_cache.get(key, generation, build)
+        return json_response(request, None, body=entry.body, etag=entry.etag)
+
+    # ===== NATIVE ROUTES =====
+
+    @handle_errors("fetching leaderboard")
+    async def get_global_leaderboard(request):
+        """Same as the Flask /api/leaderboard"""
+        fields, error = split_fields(request.query_params.get("fields"), LEADERBOARD_FIELDS)
+        if error:
+            return json_response(request, {"error": error}, 400)
+        fields = fields or LEADERBOARD_FIELDS
+
+        limit = int_param(request, "limit", 290)
+
+        async with request.app.state.sessions() as session:
+            profile, error = await resolve_profile(session, request)
+            if error:
+                return json_response(request, {"error": error}, 404)
+
+            async def build():
+                rows = (await session.execute(global_leaderboard_query(limit, fields, profile))).all()
+                with flask_app.app_context():
+                    return flask_app.json.dumps(global_leaderboard_results(rows, fields)).encode()
+
+            key = ('leaderboard', limit, tuple(fields), profile.profile_name if profile else None)
+            return await cached_response(request, session, key, build)
+
+    @handle_errors("fetching sector leaderboard")
+    async def get_sector_leaderboard(request):
+        """Same as the Flask /api/sectors/<id>/leaderboard"""
+        sector_id = request.path_params['sector_id']
+
+        fields, error = split_fields(request.query_params.get("fields"), LIST_FIELDS)
+        if error:
+            return json_response(request, {"error": error}, 400)
+
+        await reference_ready()
+        with flask_app.app_context():
+            if sector_id not in reference_data().sectors:
+                return json_response(request, {"error": "Resource not found"}, 404)
+
+        async with request.app.state.sessions() as session:
+            profile, error = await resolve_profile(session, request)
+            if error:
+                return json_response(request, {"error": error}, 404)
+
+            async def build():
+                rows = (await session.execute(sector_leaderboard_query(sector_id, fields, profile))).all()
+                with flask_app.app_context():
+                    return flask_app.json.dumps(sector_leaderboard_results(sector_id, rows, fields, profile)).encode()
+
+            key = ('sector_leaderboard', sector_id, tuple(fields or ()), profile.profile_name if profile else None)
+            return await cached_response(request, session, key, build)
+
+    @handle_errors("opening event stream")
+    async def get_events(request):
+        """Same as the Flask /api/events"""
+        async with request.app.state.sessions() as session:
+            run_id = (await session.execute(latest_run_query())).scalar()
+
+        broker = flask_app.extensions['event_broker']
+        last_event_id = request.headers.get('last-event-id')
+        keepalive = flask_app.config["EVENTS_KEEPALIVE"]
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue(maxsize=16)
+
+        def put(event):
+            if not events.full():
+                events.put_nowait(event)
+
+        def deliver(event):
+            # Called on the broker's listener thread
+            loop.call_soon_threadsafe(put, event)
+
+        async def stream():
+            broker.subscribe(deliver)
+            try:
+                yield "retry: 5000\n\n"
+
+                latest = broker.last_event
+                if latest and run_id is not None and latest['run_id'] > run_id:
+                    put(latest)
+                elif str(run_id) != last_event_id:
+                    yield format_sse({'run_id': run_id}, 'generation', run_id)
+
+                while True:
+                    try:
+                        event = await asyncio.wait_for(events.get(), keepalive)
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+                        continue
+                    yield format_sse(event, 'generation', event['run_id'])
+            finally:
+                broker.unsubscribe(deliver)
+
+        return StreamingResponse(stream(), media_type='text/event-stream', headers={
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    async def health_check(request):
+        """Same as the Flask /api/health, over the async pool"""
+        try:
+            async with request.app.state.engine.connect() as conn:
+                await conn.execute(text('SELECT 1'))
+            return json_response(request, {'status': 'healthy', 'database': 'connected'})
+        except Exception as e:
+            return json_response(request, {
+                'status': 'unhealthy',
+                'database': 'disconnected',
+                'error': str(e)
+            }, 500)
+
+    @handle_errors("fetching pool stats")
+    async def get_pool_stats(request):
+        """Usage of both pools: sync (Flask fallback routes) and async (native routes)"""
+        with flask_app.app_context():
+            sync_stats = pool_stats(db.engine)
+
+        return json_response(request, {
+            'sync': sync_stats,
+            'async': pool_stats(request.app.state.engine.sync_engine)
+        })
+
+    async def warm_responses(app):
+        """
+        Request the hot endpoints through this app, so the natively served
+        leaderboards are in the async response cache. Returns the count.
+        """
+        with flask_app.app_context():
+            urls = hot_urls()
+
+        for url in urls:
+            path, _, query = url.partition('?')
+            status = await asgi_get(app, path, query)
+            if status != 200:
+                raise RuntimeError(f"GET {url} returned {status}")
+        return len(urls)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        app.state.engine = create_async_engine(database_uri, **async_engine_options(database_uri))
+        app.state.sessions = async_sessionmaker(app.state.engine, expire_on_commit=False)
+        track_pool(app.state.engine.sync_engine)
+
+        # Warm up before accepting requests: open the async pool's connections
+        # here, and the Flask app's (pool, caches) in the background; GET
+        # /api/ready reports when that has finished
+        started = time.perf_counter()
+        connections = []
+        try:
+            for _ in range(async_pool_size(app.state.engine)):
+                conn = await app.state.engine.connect()
+                connections.append(conn)
+                await conn.execute(text('SELECT 1'))
+            logger.info(f"Warm-up: async pool opened {len(connections)} connections in "
+                        f"{(time.perf_counter() - started) * 1000:.1f} ms")
+        except Exception as e:
+            logger.warning(f"Async pool not pre-opened: {e}")
+        finally:
+            for conn in connections:
+                await conn.close()
+        warmup = flask_app.extensions['warmup']
+        loop = asyncio.get_running_loop()
+        warmup.add_step('async_responses',
+                        lambda: asyncio.run_coroutine_threadsafe(warm_responses(app), loop).result())
+        warmup.start()
+
+        logger.info(f"Async database pool ready ({app.state.engine.pool.status()})")
+        yield
+        await app.state.engine.dispose()
+
+    return Starlette(
+        routes=[
+            Route("/api/leaderboard", get_global_leaderboard, methods=["GET"]),
+            Route("/api/sectors/{sector_id:int}/leaderboard", get_sector_leaderboard, methods=["GET"]),
+            Route("/api/events", get_events, methods=["GET"]),
+            Route("/api/health", health_check, methods=["GET"]),
+            Route("/api/pool", get_pool_stats, methods=["GET"]),
+            # Everything else: the Flask app, run in a thread pool
+            Mount("/", app=WsgiToAsgi(flask_app)),
+        ],
+        lifespan=lifespan,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run("asgi:create_asgi_app", factory=True, host='0.0.0.0', port=5000,
+                workers=int(os.getenv("WEB_CONCURRENCY", "1")))
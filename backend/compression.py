@@ -0,0 +1,93 @@
+"""
+Negotiated response compression for the JSON API.
+
+Picks zstd, brotli or gzip from the client's Accept-Encoding header and
+compresses JSON responses at or above COMPRESS_MIN_SIZE bytes. gzip is always
+available; brotli and zstd are only offered when their packages are installed.
+"""
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+def available_encodings():
+    """Installed encodings in server preference order (client q-values win)"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+# Levels for per-response compression (fast) and for files compressed once
+# ahead of time (smallest output)
+LEVELS = {'zstd': 3, 'br': 5, 'gzip': 6}
+MAX_LEVELS = {'zstd': 19, 'br': 11, 'gzip': 9}
+
+
+def compress(data, encoding, level=None):
+    """Compress bytes with the given content-coding (level defaults to LEVELS)"""
+    level = level or LEVELS.get(encoding)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=level, mtime=0)  # same input, same bytes
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def negotiate(data, accept_encodings, min_size):
+    """
+    Compress a response body with the best encoding the client accepts.
+    `accept_encodings` is a parsed Accept-Encoding header (werkzeug Accept).
+    Returns (body, encoding); encoding is None if the body was left as-is.
+    """
+    if len(data) < min_size:
+        return data, None
+    
+    encoding = accept_encodings.best_match(available_encodings())
+    if not encoding:
+        return data, None
+    
+    return compress(data, encoding), encoding
+
+
+def init_compression(app):
+    """Register the after_request hook that compresses JSON responses"""
+    
+    @app.after_request
+    def compress_response(response):
+        if not response.is_json or response.direct_passthrough or response.is_streamed:
+            return response
+        
+        response.vary.add('Accept-Encoding')
+        
+        if response.status_code < 200 or response.status_code >= 300 or 'Content-Encoding' in response.headers:
+            return response
+        
+        data, encoding = negotiate(response.get_data(), request.accept_encodings,
+                                   app.config.get("COMPRESS_MIN_SIZE", 1024))
+        if not encoding:
+            return response
+        
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        
+        # The encoded bytes differ from the ones a strong ETag was computed
+        # for; a weak ETag still matches If-None-Match on the next request
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
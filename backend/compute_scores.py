@@ -1,272 +1,443 @@
-import math
-import statistics
+import argparse
+import hashlib
+from collections import defaultdict
 from datetime import datetime
-from sqlalchemy import and_
-from models import db, Sector, Metric, SectorMetric, Company, CompanyMetric, Score
+import numpy as np
+from sqlalchemy import and_, func, insert, select, text, update
+from models import (db, Sector, Metric, SectorMetric, Company, CompanyMetric, Score,
+                    WeightProfile, ProfileWeight, ProfileScore, ScoringRun, MetricDistribution,
+                    ScoreComponent, RankMovement, invalidate_reference_data)
+from scoring import (ABSOLUTE_METRICS, normalize_value, score_metric_values, weighted_profile_scores, RunningStats,
+                     score_from_stats, z_from_stats)
 from app import create_app
+from artifacts import publish_artifacts
+from distributions import publish_distributions
+from events import notify_published
 
+# Bump when the scoring algorithm changes so the next run recomputes everything
+SCORING_VERSION = 1
 
-def normal_cdf(z):
-    """Standard normal cumulative distribution function"""
-    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
 
+def fingerprint(*parts):
+    """Stable hash of the repr of each part"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\x1f")
+    return digest.hexdigest()
 
-# Define which metrics should be normalized by turnover (absolute values)
-# Percentages and ratios should NOT be normalized
-ABSOLUTE_METRICS = {
-    1,  # Operational_energy (MWh/Year)
-    3,  # C02_emissions_yearly (tCO2e)
-    6,  # Shipping_emmisions (tCO2e/km) - already normalized, keep as is
-    9,  # food_waste (Tonne/year)
-    10,  # Water_use (cubic m/year)
-    13,  # shipping_distance (km)
-    14,  # Energy_intensity (MWh/tonne) - already intensity, keep as is
-    15,  # waste_landfill (tonne.year)
-    17,  # Air_pollutant_emmisions (kg/year)
-    18,  # Embedded_carbon_per_project (tCO2e/proj) - already normalized
-}
 
-
-def normalize_value(metric_id, value, company_turnover):
+class ScoringInputs:
     """
-    Normalize metric value by log(turnover) for absolute metrics.
+    Everything the scorer reads, loaded with one query per table:
+    companies, metrics, sector weights, weighting profiles and metric values.
+
+    With load_values=False only the small reference tables are loaded
+    (metrics, sectors, weights, profiles), as used by the streaming scorer.
     """
-    if metric_id in ABSOLUTE_METRICS and company_turnover and company_turnover > 0:
-        # Convert billions to millions for more reasonable log values
-        turnover_millions = company_turnover * 1000
-        # Use log base 10 + 1 to avoid log(0)
-        log_scale = math.log10(turnover_millions + 1)
-        # Return value normalized by log of turnover
-        return value / log_scale
-    else:
-        # Return raw value for percentages
-        return value
 
+    def __init__(self, load_values=True):
+        self.metrics = {m.metric_id: m for m in Metric.query.all()}
+        self.sectors = Sector.query.order_by(Sector.id).all()
+
+        self.sector_metrics = defaultdict(list)
+        for sm in SectorMetric.query.order_by(SectorMetric.sector_metric_id).all():
+            self.sector_metrics[sm.sector_id].append(sm)
+
+        self.profiles = WeightProfile.query.order_by(WeightProfile.profile_id).all()
+        self.profile_overrides = {
+            (pw.profile_id, pw.sector_id, pw.metric_id): float(pw.weight) if pw.weight else 0.0
+            for pw in ProfileWeight.query.all()
+        }
+
+        # Sorted comparison values of percentile-mode metrics, filled while
+        # scoring: {(sector_id or None for global, metric_id): array}
+        self.sorted_values = {}
+
+        # Per-metric detail behind each scored sector, filled while scoring:
+        # {sector_id: ((companies x metrics) normalized values, z-scores)}
+        self.sector_details = {}
+
+        self.company_turnover = {}
+        self.company_sector = {}
+        self.values_by_metric = defaultdict(list)
+        self.company_value = {}
+        if not load_values:
+            return
+
+        for company_id, sector_id, turnover in db.session.query(
+                Company.company_id, Company.sector_id, Company.turnover).order_by(Company.company_id):
+            self.company_turnover[company_id] = float(turnover) if turnover else None
+            self.company_sector[company_id] = sector_id
+
+        # All non-null values per metric (row order), and each company's first value per metric
+        for company_id, metric_id, value in db.session.query(
+                CompanyMetric.company_id, CompanyMetric.metric_id, CompanyMetric.value
+        ).filter(CompanyMetric.value.isnot(None)).order_by(CompanyMetric.id):
+            self.values_by_metric[metric_id].append((company_id, float(value)))
+            self.company_value.setdefault((company_id, metric_id), float(value))
+
+    def companies_in_sector(self, sector_id):
+        return [cid for cid, sid in self.company_sector.items() if sid == sector_id]
+
+    def sector_fingerprint(self, sector_id):
+        """
+        Fingerprint of everything a sector's scores depend on: its companies and
+        turnovers, its metric values, weights, invert flags, scoring modes and
+        profile weights.
+        """
+        company_ids = self.companies_in_sector(sector_id)
+        members = set(company_ids)
+        sec_metrics = self.sector_metrics[sector_id]
+
+        return fingerprint(
+            SCORING_VERSION,
+            [(cid, self.company_turnover[cid]) for cid in company_ids],
+            [
+                (sm.metric_id, float(sm.weight or 0), bool(self.metrics[sm.metric_id].invert_score),
+                 self.metrics[sm.metric_id].scoring_mode)
+                for sm in sec_metrics
+            ],
+            [(p.profile_id, p.profile_name) for p in self.profiles],
+            sorted((key, w) for key, w in self.profile_overrides.items() if key[1] == sector_id),
+            [
+                (sm.metric_id, [(cid, v) for cid, v in self.values_by_metric[sm.metric_id] if cid in members])
+                for sm in sec_metrics
+            ],
+        )
+
+    def reference_fingerprint(self):
+        """Fingerprint of the sectors, metrics and weights served from the API's reference-data cache"""
+        return fingerprint(
+            [s.to_dict() for s in self.sectors],
+            [self.metrics[m_id].to_dict() for m_id in sorted(self.metrics)],
+            [sm.to_dict() for sid in sorted(self.sector_metrics) for sm in self.sector_metrics[sid]],
+        )
+
+    def global_fingerprint(self):
+        """
+        Fingerprint of everything the global (cross-sector) scores depend on.
+        Weights are deliberately excluded: global scores are unweighted.
+        """
+        metric_ids = sorted({sm.metric_id for sms in self.sector_metrics.values() for sm in sms})
+
+        return fingerprint(
+            SCORING_VERSION,
+            sorted(self.company_turnover.items()),
+            [(m_id, bool(self.metrics[m_id].invert_score), self.metrics[m_id].scoring_mode) for m_id in metric_ids],
+            [(m_id, self.values_by_metric[m_id]) for m_id in metric_ids],
+        )
+
+    def weight_matrix(self, sector_id):
+        """
+        (metrics x (1 + profiles)) weight matrix for a sector. Column 0 holds the
+        base sector_metrics weights; column k holds profile k-1's weights.
+        """
+        sec_metrics = self.sector_metrics[sector_id]
+        weights = np.zeros((len(sec_metrics), 1 + len(self.profiles)))
+        for j, sm in enumerate(sec_metrics):
+            base = float(sm.weight) if sm.weight else 0.0
+            weights[j, 0] = base
+            for k, profile in enumerate(self.profiles, 1):
+                weights[j, k] = self.profile_overrides.get((profile.profile_id, sector_id, sm.metric_id), base)
+        return weights
+
+    def sector_metric_scores(self, sector_id, company_ids):
+        """
+        Score each company on each of the sector's metrics against the sector's
+        normalized values. Returns ((companies x metrics) array with NaN where a
+        company has no usable value, [comparison set size per metric]).
+        """
+        sector_companies = set(company_ids)
+        sec_metrics = self.sector_metrics[sector_id]
+        scores = np.full((len(company_ids), len(sec_metrics)), np.nan)
+        normalized = np.full(scores.shape, np.nan)
+        z = np.full(scores.shape, np.nan)
+        counts = []
+
+        for j, sm in enumerate(sec_metrics):
+            m_id = sm.metric_id
+
+            # Gather sector-wide NORMALIZED values, skipping companies without turnover
+            normalized_vals = [
+                normalize_value(m_id, value, self.company_turnover[cid])
+                for cid, value in self.values_by_metric[m_id]
+                if cid in sector_companies and self.company_turnover.get(cid)
+            ]
+            counts.append(len(normalized_vals))
+
+            rows, company_vals = [], []
+            for i, cid in enumerate(company_ids):
+                value = self.company_value.get((cid, m_id))
+                turnover = self.company_turnover.get(cid)
+                if value is not None and turnover:
+                    rows.append(i)
+                    company_vals.append(normalize_value(m_id, value, turnover))
+
+            metric_scores, metric_z, sorted_vals = score_metric_values(
+                company_vals,
+                normalized_vals,
+                invert_score=bool(self.metrics[m_id].invert_score),
+                scoring_mode=self.metrics[m_id].scoring_mode
+            )
+            if rows:
+                scores[rows, j] = metric_scores
+                normalized[rows, j] = company_vals
+                z[rows, j] = metric_z
+            if sorted_vals is not None:
+                self.sorted_values[(sector_id, m_id)] = sorted_vals
+
+        self.sector_details[sector_id] = (normalized, z)
+        return scores, counts
 
-def compute_metric_score(company_value, comparison_values, invert_score=False):
-    """
-    Compute 0-100 score for a metric value relative to comparison set.
 
-    Args:
-        company_value: The company's (normalized) value for this metric
-        comparison_values: List of all (normalized) values to compare against
-        invert_score: If FALSE, higher is better. If TRUE, lower is better.
+def nan_to_none(value):
+    return None if np.isnan(value) else float(value)
 
-    Returns:
-        Score from 0-100, where 50 is average
+
+def component_rows(company_ids, metric_ids, metric_scores, normalized, z, weights):
+    """
+    ScoreComponent mappings for every (company, metric) score in a sector.
+    Each metric's contribution is its score times its share of the weights the
+    company has scores for, so a company's contributions sum to its sector score.
     """
-    # Handle empty comparison data
-    if not comparison_values or all(v is None for v in comparison_values):
-        return 50.0
+    rows = []
+    for i, cid in enumerate(company_ids):
+        present = ~np.isnan(metric_scores[i])
+        weight_total = weights[present].sum()
+
+        for j in np.flatnonzero(present):
+            rows.append({
+                'company_id': cid,
+                'metric_id': metric_ids[j],
+                'normalized_value': float(normalized[i, j]),
+                'z_score': nan_to_none(z[i, j]),
+                'metric_score': float(metric_scores[i, j]),
+                'weight': float(weights[j]),
+                'contribution': float(metric_scores[i, j] * weights[j] / weight_total) if weight_total > 0 else None
+            })
+    return rows
+
+
+def assign_ranks(scores, company_sector):
+    """
+    Sequential ranks by score descending (missing scores last, ties by company id).
+    Returns ({company_id: sector_rank}, {company_id: overall_rank}).
+    """
+    ordered = sorted(scores, key=lambda cid: (scores[cid] is None, -(scores[cid] or 0.0), cid))
 
-    # Convert to float and filter None
-    vals = [float(v) for v in comparison_values if v is not None]
+    overall_rank = {cid: i for i, cid in enumerate(ordered, 1)}
+    sector_rank = {}
+    next_rank = defaultdict(int)
+    for cid in ordered:
+        next_rank[company_sector.get(cid)] += 1
+        sector_rank[cid] = next_rank[company_sector.get(cid)]
 
-    if len(vals) == 0:
-        return 50.0
+    return sector_rank, overall_rank
 
-    mean = statistics.mean(vals)
 
-    # Use standard deviation
-    if len(vals) > 1:
-        std = statistics.stdev(vals)
-    else:
-        std = 0.0
+def print_top_companies():
+    """Print the published top 20 by global and by sector score"""
+    # Show top 20 by GLOBAL score
+    print("\n TOP 20 COMPANIES (by GLOBAL score - turnover-adjusted cross-sector):")
+    print("-" * 80)
 
-    # If all values are identical, return 50
-    if std == 0.0:
-        return 50.0
+    top_scores = Score.query.order_by(Score.global_score.desc()).limit(20).all()
+    for i, score in enumerate(top_scores, 1):
+        comp = Company.query.get(score.company_id)
+        sector = Sector.query.get(comp.sector_id)
+        global_val = float(score.global_score) if score.global_score else 0
+        sector_val = float(score.sector_score) if score.sector_score else 0
+        turnover_val = float(comp.turnover) if comp.turnover else 0
+        print(
+            f"{i:2d}. {comp.name[:30]:30s} | {sector.sector_name:15s} | Turnover: £{turnover_val:6.2f}B | Global: {global_val:5.2f}")
 
-    # Calculate z-score
-    z = (company_value - mean) / std
+    print("\n TOP 20 COMPANIES (by SECTOR score):")
+    print("-" * 80)
 
-    # Apply inversion
-    # invert_score=FALSE: higher is better (renewable %, recycling %)
-    # invert_score=TRUE: lower is better (emissions, waste)
-    if invert_score:
-        z = -z  # Flip so lower values get higher scores
+    top_sector_scores = Score.query.order_by(Score.sector_score.desc()).limit(20).all()
+    for i, score in enumerate(top_sector_scores, 1):
+        comp = Company.query.get(score.company_id)
+        sector = Sector.query.get(comp.sector_id)
+        sector_val = float(score.sector_score) if score.sector_score else 0
+        global_val = float(score.global_score) if score.global_score else 0
+        turnover_val = float(comp.turnover) if comp.turnover else 0
+        print(
+            f"{i:2d}. {comp.name[:30]:30s} | {sector.sector_name:15s} | Turnover: £{turnover_val:6.2f}B | Sector: {sector_val:5.2f}")
 
-    # Convert z-score to 0-100 scale using normal CDF
-    score = normal_cdf(z) * 100.0
+    print("=" * 80)
 
-    # Clamp to 0-100 range
-    return max(0.0, min(100.0, score))
 
+def set_if_changed(row, attr, value):
+    """Assign a column only if its value changed; returns True when it did"""
+    current = getattr(row, attr)
+    if current is None and value is None:
+        return False
+    if current is not None and value is not None and float(current) == float(value):
+        return False
+    setattr(row, attr, value)
+    return True
 
-def compute_all_scores():
+
+def compute_all_scores(force=False):
     """
     Compute scores for all companies and save to database.
+
+    Per-metric scores are computed once per sector; the base sector score and
+    every weighting profile's sector score are then derived from them with a
+    single matrix product.
+
+    Inputs are fingerprinted per sector and globally. Only sectors whose
+    fingerprint changed since the last run are rescored (global scores only if
+    the global fingerprint changed), and only changed rows are written. If
+    nothing changed the run is a no-op. `force` rescores everything.
+
+    Returns the new ScoringRun, or None if nothing changed.
     """
     print("=" * 80)
     print("COMPUTING SUSTAINABILITY SCORES (TURNOVER-ADJUSTED)")
     print("=" * 80)
 
+    started_at = datetime.utcnow()
+    inputs = ScoringInputs()
+    company_turnover = inputs.company_turnover
+
+    # Compare input fingerprints with the last published run
+    sector_fingerprints = {sector.id: inputs.sector_fingerprint(sector.id) for sector in inputs.sectors}
+    global_fingerprint = inputs.global_fingerprint()
+
+    # Tell API processes to reload sectors/metrics/weights if they were edited
+    if invalidate_reference_data(inputs.reference_fingerprint()):
+        print("\nReference data changed; API caches will reload")
+
+    last_run = ScoringRun.query.order_by(ScoringRun.run_id.desc()).first()
+    if last_run and not force:
+        previous = {int(k): v for k, v in (last_run.sector_fingerprints or {}).items()}
+        changed_sectors = {sid for sid, fp in sector_fingerprints.items() if previous.get(sid) != fp}
+        removed_sectors = set(previous) - set(sector_fingerprints)
+        global_changed = last_run.global_fingerprint != global_fingerprint
+
+        if not changed_sectors and not removed_sectors and not global_changed:
+            db.session.commit()  # the reference-data version bump, if any
+            print(f"\nInputs unchanged since run {last_run.run_id}; nothing to publish")
+            print("=" * 80)
+            return None
+    else:
+        changed_sectors = set(sector_fingerprints)
+        global_changed = True
+
+    # Published scores, reused for unchanged sectors and updated in place
+    existing_scores = {s.company_id: s for s in Score.query.all()}
+    existing_profile_scores = {(ps.profile_id, ps.company_id): ps for ps in ProfileScore.query.all()}
+
+    def published(row, attr):
+        value = getattr(row, attr) if row else None
+        return float(value) if value is not None else None
+
     all_company_sector_scores = {}
+    profile_sector_scores = {p.profile_id: {} for p in inputs.profiles}
     companies_processed = set()
+    components = []
 
-    # Build turnover lookup
-    company_turnover = {}
-    for comp in Company.query.all():
-        company_turnover[comp.company_id] = float(comp.turnover) if comp.turnover else None
+    if inputs.profiles:
+        print(f"\nWeighting profiles: {', '.join(p.profile_name for p in inputs.profiles)}")
 
     # Process each sector
-    sectors = Sector.query.all()
-
-    for sector in sectors:
+    for sector in inputs.sectors:
         print(f"\nProcessing Sector {sector.id}: {sector.sector_name}")
         print("-" * 80)
 
-        sec_metrics = SectorMetric.query.filter_by(sector_id=sector.id).all()
+        sec_metrics = inputs.sector_metrics[sector.id]
 
         if not sec_metrics:
             print(f"No metrics defined for this sector")
             continue
 
-        metric_ids = [sm.metric_id for sm in sec_metrics]
-        weights_map = {sm.metric_id: float(sm.weight) for sm in sec_metrics}
+        company_ids = inputs.companies_in_sector(sector.id)
+        companies_processed.update(company_ids)
 
-        total_weight = sum(weights_map.values())
-        print(f"   Total weight: {total_weight:.4f}")
-
-        # Gather sector-wide NORMALIZED values for each metric
-        sector_values = {}
-
-        for m_id in metric_ids:
-            rows = db.session.query(CompanyMetric).join(Company).filter(
-                and_(
-                    Company.sector_id == sector.id,
-                    CompanyMetric.metric_id == m_id,
-                    CompanyMetric.value.isnot(None)
-                )
-            ).all()
+        if sector.id not in changed_sectors:
+            print(f"   Inputs unchanged, keeping published scores for {len(company_ids)} companies")
+            for cid in company_ids:
+                all_company_sector_scores[cid] = published(existing_scores.get(cid), 'sector_score')
+                for profile in inputs.profiles:
+                    profile_sector_scores[profile.profile_id][cid] = published(
+                        existing_profile_scores.get((profile.profile_id, cid)), 'sector_score')
+            continue
 
-            # Normalize values by company turnover
-            normalized_vals = []
-            for r in rows:
-                turnover = company_turnover.get(r.company_id)
-                if turnover:
-                    normalized_val = normalize_value(m_id, float(r.value), turnover)
-                    normalized_vals.append(normalized_val)
+        weights = inputs.weight_matrix(sector.id)
+        print(f"   Total weight: {weights[:, 0].sum():.4f}")
 
-            sector_values[m_id] = normalized_vals
+        metric_scores, counts = inputs.sector_metric_scores(sector.id, company_ids)
 
-            metric = Metric.query.get(m_id)
+        for sm, count in zip(sec_metrics, counts):
+            m_id = sm.metric_id
             normalization = " (intensity)" if m_id in ABSOLUTE_METRICS else " (raw)"
-            print(f"   Metric {m_id:2d} ({metric.metric_name:30s}): {len(normalized_vals):3d} values{normalization}")
-
-        # Score each company in the sector
-        companies_in_sector = Company.query.filter_by(sector_id=sector.id).all()
-        print(f"\n   Scoring {len(companies_in_sector)} companies...")
+            mode = ", percentile" if inputs.metrics[m_id].scoring_mode == 'percentile' else ""
+            print(f"   Metric {m_id:2d} ({inputs.metrics[m_id].metric_name:30s}): {count:3d} values{normalization}{mode}")
 
-        for comp in companies_in_sector:
-            weighted_sum = 0.0
-            weight_sum_present = 0.0
+        # Score each company in the sector, for the base weights and every profile at once
+        print(f"\n   Scoring {len(company_ids)} companies...")
+        sector_scores = weighted_profile_scores(metric_scores, weights)
 
-            for m_id in metric_ids:
-                cm = CompanyMetric.query.filter_by(
-                    company_id=comp.company_id,
-                    metric_id=m_id
-                ).first()
+        for i, cid in enumerate(company_ids):
+            scores = [nan_to_none(v) for v in sector_scores[i]]
+            all_company_sector_scores[cid] = scores[0]
+            for profile, score in zip(inputs.profiles, scores[1:]):
+                profile_sector_scores[profile.profile_id][cid] = score
 
-                if cm and cm.value is not None:
-                    turnover = company_turnover.get(comp.company_id)
-                    if not turnover:
-                        continue
-
-                    metric = Metric.query.get(m_id)
-                    normalized_val = normalize_value(m_id, float(cm.value), turnover)
-
-                    # Compute score for this normalized metric
-                    m_score = compute_metric_score(
-                        normalized_val,
-                        sector_values[m_id],
-                        invert_score=bool(metric.invert_score)
-                    )
-
-                    w = weights_map.get(m_id, 0.0)
-                    weighted_sum += m_score * w
-                    weight_sum_present += w
-
-            if weight_sum_present > 0:
-                sector_score = weighted_sum / weight_sum_present
-            else:
-                sector_score = None
-
-            all_company_sector_scores[comp.company_id] = sector_score
-            companies_processed.add(comp.company_id)
+        # Per-metric breakdown of the base sector scores
+        normalized, z = inputs.sector_details[sector.id]
+        components.extend(component_rows(
+            company_ids, [sm.metric_id for sm in sec_metrics], metric_scores, normalized, z, weights[:, 0]
+        ))
 
     print("\n" + "=" * 80)
     print("COMPUTING GLOBAL SCORES (TURNOVER-ADJUSTED, CROSS-SECTOR)")
     print("=" * 80)
 
-    # Get all unique metrics
-    all_metrics_used = set()
-    for sm in SectorMetric.query.all():
-        all_metrics_used.add(sm.metric_id)
-
-    print(f"\nComparing companies globally across {len(all_metrics_used)} metrics...")
-
-    # Gather GLOBAL normalized values
-    global_metric_values = {}
-
-    for m_id in all_metrics_used:
-        rows = db.session.query(CompanyMetric).filter(
-            CompanyMetric.metric_id == m_id,
-            CompanyMetric.value.isnot(None)
-        ).all()
-
-        normalized_vals = []
-        for r in rows:
-            turnover = company_turnover.get(r.company_id)
-            if turnover:
-                normalized_val = normalize_value(m_id, float(r.value), turnover)
-                normalized_vals.append(normalized_val)
-
-        if normalized_vals:
-            global_metric_values[m_id] = normalized_vals
-            metric = Metric.query.get(m_id)
-            normalization = " (intensity)" if m_id in ABSOLUTE_METRICS else " (raw)"
-            print(f"   Metric {m_id:2d} ({metric.metric_name:30s}): {len(normalized_vals):3d} values{normalization}")
-
-    # Compute global scores
     all_company_global_scores = {}
 
-    print(f"\nScoring {len(companies_processed)} companies globally...")
-
-    for comp in Company.query.all():
-        company_metrics = CompanyMetric.query.filter_by(company_id=comp.company_id).all()
+    if not global_changed:
+        print(f"\nInputs unchanged, keeping published global scores")
+        for cid in companies_processed:
+            all_company_global_scores[cid] = published(existing_scores.get(cid), 'global_score')
+    else:
+        # Get all unique metrics
+        all_metrics_used = sorted({sm.metric_id for sms in inputs.sector_metrics.values() for sm in sms})
 
-        if not company_metrics:
-            all_company_global_scores[comp.company_id] = None
-            continue
+        print(f"\nComparing companies globally across {len(all_metrics_used)} metrics...")
 
-        turnover = company_turnover.get(comp.company_id)
-        if not turnover:
-            all_company_global_scores[comp.company_id] = None
-            continue
+        # Score every value of each metric against the GLOBAL normalized values
+        company_metric_scores = defaultdict(list)
 
-        metric_scores = []
-
-        for cm in company_metrics:
-            if cm.value is None or cm.metric_id not in global_metric_values:
+        for m_id in all_metrics_used:
+            rows = [(cid, value) for cid, value in inputs.values_by_metric[m_id] if company_turnover.get(cid)]
+            if not rows:
                 continue
 
-            metric = Metric.query.get(cm.metric_id)
-            normalized_val = normalize_value(cm.metric_id, float(cm.value), turnover)
-
-            # Score this metric GLOBALLY
-            m_score = compute_metric_score(
-                normalized_val,
-                global_metric_values[cm.metric_id],
-                invert_score=bool(metric.invert_score)
+            normalized_vals = [normalize_value(m_id, value, company_turnover[cid]) for cid, value in rows]
+            normalization = " (intensity)" if m_id in ABSOLUTE_METRICS else " (raw)"
+            mode = ", percentile" if inputs.metrics[m_id].scoring_mode == 'percentile' else ""
+            print(f"   Metric {m_id:2d} ({inputs.metrics[m_id].metric_name:30s}): {len(normalized_vals):3d} values{normalization}{mode}")
+
+            m_scores, _, sorted_vals = score_metric_values(
+                normalized_vals,
+                normalized_vals,
+                invert_score=bool(inputs.metrics[m_id].invert_score),
+                scoring_mode=inputs.metrics[m_id].scoring_mode
             )
+            if sorted_vals is not None:
+                inputs.sorted_values[(None, m_id)] = sorted_vals
+            for (cid, _), m_score in zip(rows, m_scores):
+                company_metric_scores[cid].append(float(m_score))
 
-            metric_scores.append(m_score)
+        # Compute global scores
+        print(f"\nScoring {len(companies_processed)} companies globally...")
 
-        if metric_scores:
-            all_company_global_scores[comp.company_id] = sum(metric_scores) / len(metric_scores)
-        else:
-            all_company_global_scores[comp.company_id] = None
+        for cid in company_turnover:
+            metric_scores = company_metric_scores.get(cid)
+            all_company_global_scores[cid] = sum(metric_scores) / len(metric_scores) if metric_scores else None
 
     # Display score distributions
     print("\n" + "-" * 80)
@@ -298,55 +469,430 @@ def compute_all_scores():
     print("SAVING SCORES TO DATABASE")
     print("=" * 80)
 
-    Score.query.delete()
-
+    # Update rows in place, writing only values that changed
+    calculated_at = datetime.utcnow()
     scores_saved = 0
     for cid in companies_processed:
-        new_score = Score(
-            company_id=cid,
-            sector_score=all_company_sector_scores.get(cid),
-            global_score=all_company_global_scores.get(cid),
-            last_calculated=datetime.utcnow()
-        )
-        db.session.add(new_score)
-        scores_saved += 1
-
+        score = existing_scores.pop(cid, None)
+        if score is None:
+            score = Score(company_id=cid)
+            db.session.add(score)
+
+        changed = set_if_changed(score, 'sector_score', all_company_sector_scores.get(cid))
+        changed = set_if_changed(score, 'global_score', all_company_global_scores.get(cid)) or changed
+        if changed or score.score_id is None:
+            score.last_calculated = calculated_at
+            scores_saved += 1
+
+    # Companies no longer in a scored sector
+    for score in existing_scores.values():
+        db.session.delete(score)
+
+    # One row per (profile, company) with the profile's ranks. A changed sector
+    # can move overall ranks anywhere, so ranks are reassigned for everyone.
+    for profile in inputs.profiles:
+        sector_scores = profile_sector_scores[profile.profile_id]
+        sector_rank, overall_rank = assign_ranks(sector_scores, inputs.company_sector)
+
+        for cid in sector_scores:
+            profile_score = existing_profile_scores.pop((profile.profile_id, cid), None)
+            if profile_score is None:
+                profile_score = ProfileScore(profile_id=profile.profile_id, company_id=cid)
+                db.session.add(profile_score)
+
+            changed = set_if_changed(profile_score, 'sector_score', sector_scores[cid])
+            changed = set_if_changed(profile_score, 'global_score', all_company_global_scores.get(cid)) or changed
+            changed = set_if_changed(profile_score, 'sector_rank', sector_rank[cid]) or changed
+            changed = set_if_changed(profile_score, 'overall_rank', overall_rank[cid]) or changed
+            if changed or profile_score.profile_score_id is None:
+                profile_score.last_calculated = calculated_at
+
+    for profile_score in existing_profile_scores.values():
+        db.session.delete(profile_score)
+
+    # Replace the score breakdowns of every rescored sector
+    scored_sectors = [sid for sid in sector_fingerprints if inputs.sector_metrics[sid]]
+    ScoreComponent.query.filter(ScoreComponent.company_id.in_(
+        select(Company.company_id).where(Company.sector_id.in_(changed_sectors))
+    ) | ScoreComponent.company_id.notin_(
+        select(Company.company_id).where(Company.sector_id.in_(scored_sectors))
+    )).delete(synchronize_session=False)
+
+    if components:
+        for row in components:
+            row['last_calculated'] = calculated_at
+        db.session.execute(insert(ScoreComponent), components)
+
+    # Replace the sorted comparison arrays of every rescored scope
+    stale = MetricDistribution.sector_id.in_(changed_sectors) | MetricDistribution.sector_id.notin_(scored_sectors)
+    if global_changed:
+        stale = stale | MetricDistribution.sector_id.is_(None)
+    MetricDistribution.query.filter(stale).delete(synchronize_session=False)
+
+    for (sid, m_id), sorted_vals in inputs.sorted_values.items():
+        db.session.add(MetricDistribution(
+            metric_id=m_id,
+            sector_id=sid,
+            sorted_values=sorted_vals.tolist(),
+            computed_at=calculated_at
+        ))
+
+    run = ScoringRun(
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        global_fingerprint=global_fingerprint,
+        sector_fingerprints={str(sid): fp for sid, fp in sector_fingerprints.items()},
+        sectors_recomputed=sorted(changed_sectors),
+        global_recomputed=global_changed
+    )
+    db.session.add(run)
+    db.session.flush()
+    record_rank_movements(run)
+    publish_distributions(run, calculated_at)
     db.session.commit()
 
     print(f"\nComputed and saved scores for {scores_saved} companies")
+    if inputs.profiles:
+        print(f"Saved sector scores and ranks for {len(inputs.profiles)} weighting profiles")
+    print(f"Published as run {run.run_id} (sectors rescored: {run.sectors_recomputed or 'none'}, "
+          f"global rescored: {'yes' if global_changed else 'no'})")
     print("=" * 80)
 
-    # Show top 20 by GLOBAL score
-    print("\n TOP 20 COMPANIES (by GLOBAL score - turnover-adjusted cross-sector):")
-    print("-" * 80)
+    print_top_companies()
+
+    return run
+
+
+# Sequential ranks per profile (missing scores last, ties by company id),
+# matching assign_ranks but computed inside the database
+RANK_PROFILE_SCORES_SQL = text("""
+    UPDATE profile_scores
+    SET sector_rank = ranked.sector_rank, overall_rank = ranked.overall_rank
+    FROM (
+        SELECT ps.profile_score_id,
+               ROW_NUMBER() OVER (PARTITION BY ps.profile_id, c.sector_id
+                                  ORDER BY ps.sector_score DESC NULLS LAST, ps.company_id) AS sector_rank,
+               ROW_NUMBER() OVER (PARTITION BY ps.profile_id
+                                  ORDER BY ps.sector_score DESC NULLS LAST, ps.company_id) AS overall_rank
+        FROM profile_scores ps
+        JOIN companies c ON c.company_id = ps.company_id
+    ) AS ranked
+    WHERE profile_scores.profile_score_id = ranked.profile_score_id
+""")
+
+
+# Ranks of the scores being published (same order as assign_ranks) next to
+# the previous run's rank_movements rows, in one INSERT ... SELECT
+RECORD_RANK_MOVEMENTS_SQL = text("""
+    INSERT INTO rank_movements (
+        run_id, previous_run_id, company_id, sector_id, sector_score, global_score,
+        sector_rank, overall_rank, previous_sector_rank, previous_overall_rank,
+        sector_rank_change, overall_rank_change, sector_score_change, global_score_change, computed_at
+    )
+    SELECT :run_id, :previous_run_id, ranked.company_id, ranked.sector_id, ranked.sector_score, ranked.global_score,
+           ranked.sector_rank, ranked.overall_rank, prev.sector_rank, prev.overall_rank,
+           CASE WHEN prev.sector_id = ranked.sector_id THEN prev.sector_rank - ranked.sector_rank END,
+           prev.overall_rank - ranked.overall_rank,
+           ranked.sector_score - prev.sector_score,
+           ranked.global_score - prev.global_score,
+           :computed_at
+    FROM (
+        SELECT s.company_id, c.sector_id, s.sector_score, s.global_score,
+               ROW_NUMBER() OVER (PARTITION BY c.sector_id ORDER BY s.sector_score DESC, s.company_id) AS sector_rank,
+               ROW_NUMBER() OVER (ORDER BY s.sector_score DESC, s.company_id) AS overall_rank
+        FROM scores s
+        JOIN companies c ON c.company_id = s.company_id
+        WHERE s.sector_score IS NOT NULL
+    ) AS ranked
+    LEFT JOIN rank_movements prev ON prev.company_id = ranked.company_id AND prev.run_id = :previous_run_id
+""")
+
+
+def record_rank_movements(run):
+    """
+    Replace rank_movements with the ranks being published in `run` (scored
+    companies only) and their change since the previous run's rows. Call after the scores are written,
+    in the same transaction.
+    """
+    previous_run_id = db.session.query(func.max(RankMovement.run_id)).filter(
+        RankMovement.run_id != run.run_id
+    ).scalar()
 
-    top_scores = Score.query.order_by(Score.global_score.desc()).limit(20).all()
-    for i, score in enumerate(top_scores, 1):
-        comp = Company.query.get(score.company_id)
-        sector = Sector.query.get(comp.sector_id)
-        global_val = float(score.global_score) if score.global_score else 0
-        sector_val = float(score.sector_score) if score.sector_score else 0
-        turnover_val = float(comp.turnover) if comp.turnover else 0
-        print(
-            f"{i:2d}. {comp.name[:30]:30s} | {sector.sector_name:15s} | Turnover: £{turnover_val:6.2f}B | Global: {global_val:5.2f}")
+    db.session.execute(RECORD_RANK_MOVEMENTS_SQL, {
+        'run_id': run.run_id,
+        'previous_run_id': previous_run_id,
+        'computed_at': run.finished_at
+    })
+    RankMovement.query.filter(RankMovement.run_id != run.run_id).delete(synchronize_session=False)
 
-    print("\n TOP 20 COMPANIES (by SECTOR score):")
-    print("-" * 80)
 
-    top_sector_scores = Score.query.order_by(Score.sector_score.desc()).limit(20).all()
-    for i, score in enumerate(top_sector_scores, 1):
-        comp = Company.query.get(score.company_id)
-        sector = Sector.query.get(comp.sector_id)
-        sector_val = float(score.sector_score) if score.sector_score else 0
-        global_val = float(score.global_score) if score.global_score else 0
-        turnover_val = float(comp.turnover) if comp.turnover else 0
-        print(
-            f"{i:2d}. {comp.name[:30]:30s} | {sector.sector_name:15s} | Turnover: £{turnover_val:6.2f}B | Sector: {sector_val:5.2f}")
+def stream_company_values(chunk_size):
+    """
+    Stream (company_id, sector_id, turnover, metric_id, value) rows for every
+    company in company order, fetched chunk_size rows at a time through a
+    server-side cursor. metric_id/value are None for companies with no values.
+    """
+    stmt = select(
+        Company.company_id, Company.sector_id, Company.turnover, CompanyMetric.metric_id, CompanyMetric.value
+    ).outerjoin(
+        CompanyMetric, and_(CompanyMetric.company_id == Company.company_id, CompanyMetric.value.isnot(None))
+    ).order_by(Company.company_id, CompanyMetric.id).execution_options(yield_per=chunk_size)
+
+    for company_id, sector_id, turnover, metric_id, value in db.session.execute(stmt):
+        yield (company_id, sector_id, float(turnover) if turnover else None,
+               metric_id, float(value) if value is not None else None)
+
+
+def stream_companies(chunk_size):
+    """Group stream_company_values rows per company: (company_id, sector_id, turnover, [(metric_id, value)])"""
+    current = None
+    values = []
+    for company_id, sector_id, turnover, metric_id, value in stream_company_values(chunk_size):
+        if current and current[0] != company_id:
+            yield current + (values,)
+            values = []
+        current = (company_id, sector_id, turnover)
+        if metric_id is not None:
+            values.append((metric_id, value))
+    if current:
+        yield current + (values,)
+
+
+def upsert_batch(model, key_columns, pk_column, rows):
+    """
+    Bulk update rows whose key already exists and bulk insert the rest,
+    without loading ORM objects (so memory stays flat across batches).
+    """
+    if not rows:
+        return
+
+    company_ids = {r['company_id'] for r in rows}
+    keys = [getattr(model, c) for c in key_columns]
+    existing = {
+        tuple(row[:-1]): row[-1]
+        for row in db.session.execute(
+            select(*keys, getattr(model, pk_column)).where(model.company_id.in_(company_ids))
+        )
+    }
+
+    updates, inserts = [], []
+    for r in rows:
+        pk = existing.get(tuple(r[c] for c in key_columns))
+        if pk is None:
+            inserts.append(r)
+        else:
+            updates.append(dict(r, **{pk_column: pk}))
+
+    if updates:
+        db.session.execute(update(model), updates)
+    if inserts:
+        db.session.execute(insert(model), inserts)
+
+
+def compute_all_scores_streaming(chunk_size=5000):
+    """
+    Bounded-memory variant of compute_all_scores for very large datasets.
 
+    Pass 1 streams company_metrics and accumulates mean/variance per
+    (sector, metric) and per metric globally with Welford's algorithm.
+    Pass 2 streams again, scores one company at a time and writes results in
+    batches of chunk_size. Ranks are assigned in the database. Peak memory
+    depends on the number of sectors and metrics, not on the number of rows.
+    Everything is published in a single transaction at the end.
+
+    Only z-score metrics are supported: raises ValueError if any scored metric
+    uses percentile scoring.
+    """
+    print("=" * 80)
+    print(f"COMPUTING SUSTAINABILITY SCORES (STREAMING, CHUNK SIZE {chunk_size})")
     print("=" * 80)
 
+    started_at = datetime.utcnow()
+    inputs = ScoringInputs(load_values=False)
+    invalidate_reference_data(inputs.reference_fingerprint())
+
+    sector_metric_ids = {sid: [sm.metric_id for sm in sms] for sid, sms in inputs.sector_metrics.items() if sms}
+    sector_weights = {sid: inputs.weight_matrix(sid) for sid in sector_metric_ids}
+    global_metric_ids = {m_id for m_ids in sector_metric_ids.values() for m_id in m_ids}
+    invert = {m_id: bool(m.invert_score) for m_id, m in inputs.metrics.items()}
+
+    # Percentile ranks need every comparison value, which is exactly what
+    # streaming avoids holding in memory
+    percentile_metrics = sorted(m_id for m_id in global_metric_ids if inputs.metrics[m_id].scoring_mode == 'percentile')
+    if percentile_metrics:
+        raise ValueError(f"Metrics {percentile_metrics} use percentile scoring, which the streaming scorer "
+                         f"does not support; run compute_scores.py without --streaming")
+
+    # Pass 1: one-pass statistics of the normalized values
+    print("\nPass 1: accumulating sector and global statistics...")
+    sector_stats = defaultdict(RunningStats)
+    global_stats = defaultdict(RunningStats)
+    rows_read = 0
+
+    for company_id, sector_id, turnover, metric_id, value in stream_company_values(chunk_size):
+        if metric_id is None:
+            continue
+        rows_read += 1
+        if not turnover:
+            continue
+
+        normalized_val = normalize_value(metric_id, value, turnover)
+        if metric_id in sector_metric_ids.get(sector_id, ()):
+            sector_stats[(sector_id, metric_id)].add(normalized_val)
+        if metric_id in global_metric_ids:
+            global_stats[metric_id].add(normalized_val)
+
+    print(f"   Read {rows_read} metric values")
+    for (sid, m_id), stats in sorted(sector_stats.items()):
+        print(f"   Sector {sid:2d} metric {m_id:2d}: n={stats.count:6d} mean={stats.mean:14.4f} std={stats.stdev:14.4f}")
+
+    # Pass 2: score company by company, writing as we go
+    print("\nPass 2: scoring and writing...")
+    calculated_at = datetime.utcnow()
+    score_rows, profile_rows, component_batch = [], [], []
+    sector_summary, global_summary = RunningStats(), RunningStats()
+    scores_saved = 0
+
+    # Breakdowns are rewritten from scratch, like a forced full run
+    ScoreComponent.query.delete(synchronize_session=False)
+
+    def flush():
+        upsert_batch(Score, ['company_id'], 'score_id', score_rows)
+        upsert_batch(ProfileScore, ['profile_id', 'company_id'], 'profile_score_id', profile_rows)
+        if component_batch:
+            db.session.execute(insert(ScoreComponent), component_batch)
+        score_rows.clear()
+        profile_rows.clear()
+        component_batch.clear()
+
+    for company_id, sector_id, turnover, values in stream_companies(chunk_size):
+        if sector_id not in sector_metric_ids:
+            continue
+
+        # Sector score: first value per sector metric, scored against the sector's statistics
+        metric_ids = sector_metric_ids[sector_id]
+        first_values = {}
+        for metric_id, value in values:
+            first_values.setdefault(metric_id, value)
+
+        metric_scores = np.full((1, len(metric_ids)), np.nan)
+        normalized = np.full((1, len(metric_ids)), np.nan)
+        z = np.full((1, len(metric_ids)), np.nan)
+        if turnover:
+            for j, m_id in enumerate(metric_ids):
+                if m_id in first_values:
+                    stats = sector_stats.get((sector_id, m_id))
+                    normalized[0, j] = normalize_value(m_id, first_values[m_id], turnover)
+                    z_score = z_from_stats(normalized[0, j], stats)
+                    z[0, j] = np.nan if z_score is None else z_score
+                    metric_scores[0, j] = score_from_stats(normalized[0, j], stats, invert_score=invert[m_id])
+        scores = [nan_to_none(v) for v in weighted_profile_scores(metric_scores, sector_weights[sector_id])[0]]
+        component_batch.extend(
+            dict(row, last_calculated=calculated_at) for row in component_rows(
+                [company_id], metric_ids, metric_scores, normalized, z, sector_weights[sector_id][:, 0]
+            )
+        )
+
+        # Global score: every value scored against the global statistics
+        global_metric_scores = [
+            score_from_stats(normalize_value(m_id, value, turnover), global_stats[m_id], invert_score=invert[m_id])
+            for m_id, value in values if turnover and m_id in global_stats
+        ]
+        global_score = sum(global_metric_scores) / len(global_metric_scores) if global_metric_scores else None
+
+        score_rows.append({
+            'company_id': company_id,
+            'sector_score': scores[0],
+            'global_score': global_score,
+            'last_calculated': calculated_at
+        })
+        for profile, score in zip(inputs.profiles, scores[1:]):
+            profile_rows.append({
+                'profile_id': profile.profile_id,
+                'company_id': company_id,
+                'sector_score': score,
+                'global_score': global_score,
+                'last_calculated': calculated_at
+            })
+
+        if scores[0] is not None:
+            sector_summary.add(scores[0])
+        if global_score is not None:
+            global_summary.add(global_score)
+
+        scores_saved += 1
+        if len(score_rows) >= chunk_size:
+            flush()
+    flush()
+
+    # Companies no longer in a scored sector, and profiles that no longer exist
+    scored_companies = select(Company.company_id).where(Company.sector_id.in_(list(sector_metric_ids)))
+    Score.query.filter(Score.company_id.notin_(scored_companies)).delete(synchronize_session=False)
+    ProfileScore.query.filter(
+        ProfileScore.company_id.notin_(scored_companies)
+        | ProfileScore.profile_id.notin_([p.profile_id for p in inputs.profiles])
+    ).delete(synchronize_session=False)
+
+    db.session.execute(RANK_PROFILE_SCORES_SQL)
+
+    # No fingerprints: the next incremental run rescores everything once
+    run = ScoringRun(
+        started_at=started_at,
+        finished_at=datetime.utcnow(),
+        sectors_recomputed=sorted(sector_metric_ids),
+        global_recomputed=True
+    )
+    db.session.add(run)
+    db.session.flush()
+    record_rank_movements(run)
+    publish_distributions(run, calculated_at)
+    db.session.commit()
+
+    print(f"\nSector Scores: n={sector_summary.count} mean={sector_summary.mean:.2f} std={sector_summary.stdev:.2f}")
+    print(f"Global Scores: n={global_summary.count} mean={global_summary.mean:.2f} std={global_summary.stdev:.2f}")
+    print(f"\nComputed and saved scores for {scores_saved} companies")
+    print(f"Published as run {run.run_id}")
+    print("=" * 80)
+
+    print_top_companies()
+
+    return run
+
 
 if __name__ == "__main__":
-    app = create_app()
+    parser = argparse.ArgumentParser(description="Compute GreenRank sustainability scores")
+    parser.add_argument('--force', action='store_true', help="Rescore every sector even if its inputs are unchanged")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Bounded-memory two-pass scorer for very large datasets (always a full rescore)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Rows fetched / written per batch in --streaming mode")
+    parser.add_argument('--no-artifacts', action='store_true',
+                        help="Don't write static leaderboard artifacts after publishing (see artifacts.py)")
+    args = parser.parse_args()
+
+    # No statement timeout: full rescores and backfills run far longer than a request
+    app = create_app({'DB_STATEMENT_TIMEOUT_MS': 0})
     with app.app_context():
-        compute_all_scores()
\ No newline at end of file
+        if args.streaming:
+            try:
+                run = compute_all_scores_streaming(chunk_size=args.chunk_size)
+            except ValueError as e:
+                print(f"Error: {e}")
+                raise SystemExit(1)
+        else:
+            run = compute_all_scores(force=args.force)
+
+        # The scores are already published; a failure here only leaves the
+        # previous artifacts in place (rerun with python artifacts.py)
+        if run and not args.no_artifacts:
+            try:
+                publish_artifacts()
+            except OSError as e:
+                print(f"Warning: static artifacts not written: {e}")
+
+        # Push the new run to /api/events subscribers (after the artifacts, so
+        # clients that refetch find them)
+        if run:
+            try:
+                notify_published(run.run_id)
+            except Exception as e:
+                print(f"Warning: API processes not notified: {e}")
\ No newline at end of file
@@ -18,3 +18,42 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 # Flask config
 DEBUG = os.getenv("FLASK_DEBUG", "True").lower() == "true"
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key-change-in-production")
+
+# Response compression: JSON bodies smaller than this (bytes) are sent as-is
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# Seconds between checks of the cache_versions row behind the in-process
+# sectors/metrics/weights cache (changes show up within this delay)
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "30"))
+
+# Serialized leaderboard/bootstrap responses kept per process (see
+# response_cache.py); rebuilt once per scoring run
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+# Static leaderboard artifacts written by compute_scores.py (see artifacts.py)
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"))
+ARTIFACT_PAGE_SIZE = int(os.getenv("ARTIFACT_PAGE_SIZE", "50"))
+
+# Server-sent events (/api/events, see events.py): UDP port of the local
+# notification stand-in used when the database isn't Postgres, seconds between
+# keepalive comments, and most changed ranks included in an event
+EVENTS_UDP_PORT = int(os.getenv("EVENTS_UDP_PORT", "5055"))
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+EVENTS_MAX_DIFF = int(os.getenv("EVENTS_MAX_DIFF", "100"))
+
+# Connection pools (Postgres). The sync pool serves one Flask worker's threads;
+# the async pool (asgi.py) is shared by every request on an event loop, so it
+# is usually sized larger
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+ASYNC_DB_POOL_SIZE = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+ASYNC_DB_MAX_OVERFLOW = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds before a connection is replaced
+
+# Server-side statement timeout in milliseconds for API requests (0 = no limit).
+# The batch scripts (compute_scores.py, sensitivity.py, artifacts.py) run without one
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "5000"))
+
+# Async (ASGI) database URI; derived from SQLALCHEMY_DATABASE_URI when unset
+ASYNC_DATABASE_URI = os.getenv("ASYNC_DATABASE_URI")
@@ -2,6 +2,16 @@
 -- Schema matching the actual CSV structure (CSVs are source of truth)
 
 -- Drop tables in correct order (respecting foreign keys)
+DROP TABLE IF EXISTS score_distributions CASCADE;
+DROP TABLE IF EXISTS rank_movements CASCADE;
+DROP TABLE IF EXISTS score_components CASCADE;
+DROP TABLE IF EXISTS cache_versions CASCADE;
+DROP TABLE IF EXISTS metric_distributions CASCADE;
+DROP TABLE IF EXISTS scoring_runs CASCADE;
+DROP TABLE IF EXISTS rank_sensitivity CASCADE;
+DROP TABLE IF EXISTS profile_scores CASCADE;
+DROP TABLE IF EXISTS profile_weights CASCADE;
+DROP TABLE IF EXISTS weight_profiles CASCADE;
 DROP TABLE IF EXISTS scores CASCADE;
 DROP TABLE IF EXISTS company_metrics CASCADE;
 DROP TABLE IF EXISTS sector_metrics CASCADE;
@@ -24,7 +34,9 @@ CREATE TABLE metrics (
   unit TEXT,
   invert_score BOOLEAN DEFAULT FALSE,
   description TEXT,
-  source TEXT
+  source TEXT,
+  -- 'zscore' (normal CDF of the z-score) or 'percentile' (empirical percentile rank)
+  scoring_mode TEXT NOT NULL DEFAULT 'zscore' CHECK (scoring_mode IN ('zscore', 'percentile'))
 );
 
 -- SECTOR_METRICS table (CSV: sector_metric_id,sector_id,metric_id,weight)
@@ -67,12 +79,161 @@ CREATE TABLE scores (
   UNIQUE (company_id)  -- One current score per company
 );
 
+-- WEIGHT_PROFILES table (CSV: profile_id,profile_name,description)
+-- Named weighting profiles ("default", "climate-heavy", ...) scored side by side
+CREATE TABLE weight_profiles (
+  profile_id SERIAL PRIMARY KEY,
+  profile_name TEXT NOT NULL UNIQUE,
+  description TEXT
+);
+
+-- PROFILE_WEIGHTS table (CSV: profile_weight_id,profile_id,sector_id,metric_id,weight)
+-- Per-profile overrides of sector_metrics.weight; missing rows use the base weight
+CREATE TABLE profile_weights (
+  profile_weight_id SERIAL PRIMARY KEY,
+  profile_id INT NOT NULL REFERENCES weight_profiles(profile_id) ON DELETE CASCADE,
+  sector_id INT NOT NULL REFERENCES sectors(id) ON DELETE CASCADE,
+  metric_id INT NOT NULL REFERENCES metrics(metric_id) ON DELETE CASCADE,
+  weight NUMERIC DEFAULT 0.0,
+  UNIQUE (profile_id, sector_id, metric_id)
+);
+
+-- PROFILE_SCORES table (computed, not from CSV)
+CREATE TABLE profile_scores (
+  profile_score_id SERIAL PRIMARY KEY,
+  profile_id INT NOT NULL REFERENCES weight_profiles(profile_id) ON DELETE CASCADE,
+  company_id INT NOT NULL REFERENCES companies(company_id) ON DELETE CASCADE,
+  sector_score NUMERIC,
+  global_score NUMERIC,
+  sector_rank INT,
+  overall_rank INT,
+  last_calculated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (profile_id, company_id)
+);
+
+-- RANK_SENSITIVITY table (computed by sensitivity.py, not from CSV)
+-- Rank distribution under Monte Carlo perturbations of sector weights
+CREATE TABLE rank_sensitivity (
+  rank_sensitivity_id SERIAL PRIMARY KEY,
+  company_id INT NOT NULL REFERENCES companies(company_id) ON DELETE CASCADE,
+  samples INT NOT NULL,
+  concentration NUMERIC,
+  sector_rank_median INT,
+  sector_rank_p5 INT,
+  sector_rank_p95 INT,
+  overall_rank_median INT,
+  overall_rank_p5 INT,
+  overall_rank_p95 INT,
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (company_id)
+);
+
+-- SCORING_RUNS table (written by compute_scores.py, not from CSV)
+-- Input fingerprints of each published run; unchanged sectors are skipped next time
+CREATE TABLE scoring_runs (
+  run_id SERIAL PRIMARY KEY,
+  started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  finished_at TIMESTAMP,
+  global_fingerprint TEXT,
+  sector_fingerprints JSON,
+  sectors_recomputed JSON,
+  global_recomputed BOOLEAN DEFAULT TRUE
+);
+
+-- METRIC_DISTRIBUTIONS table (written by compute_scores.py, not from CSV)
+-- Sorted normalized comparison values of each percentile-mode metric, per
+-- sector (sector_id NULL = global comparison set)
+CREATE TABLE metric_distributions (
+  distribution_id SERIAL PRIMARY KEY,
+  metric_id INT NOT NULL REFERENCES metrics(metric_id) ON DELETE CASCADE,
+  sector_id INT REFERENCES sectors(id) ON DELETE CASCADE,
+  sorted_values JSON NOT NULL,
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (metric_id, sector_id)
+);
+
+-- CACHE_VERSIONS table (bumped by the importers and compute_scores.py)
+-- API processes cache sectors/metrics/sector_metrics in memory and reload
+-- them when the 'reference' row changes; cached responses (leaderboards,
+-- /api/bootstrap) are rebuilt when the 'companies' row changes
+CREATE TABLE cache_versions (
+  name TEXT PRIMARY KEY,
+  version INT NOT NULL DEFAULT 0,
+  fingerprint TEXT,
+  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- SCORE_COMPONENTS table (written by compute_scores.py, not from CSV)
+-- Per-metric breakdown of each company's sector score; contributions sum to
+-- scores.sector_score
+CREATE TABLE score_components (
+  score_component_id SERIAL PRIMARY KEY,
+  company_id INT NOT NULL REFERENCES companies(company_id) ON DELETE CASCADE,
+  metric_id INT NOT NULL REFERENCES metrics(metric_id) ON DELETE CASCADE,
+  normalized_value NUMERIC,
+  z_score NUMERIC,
+  metric_score NUMERIC,
+  weight NUMERIC,
+  contribution NUMERIC,
+  last_calculated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (company_id, metric_id)  -- Also the index the breakdown endpoint reads
+);
+
+-- RANK_MOVEMENTS table (written by compute_scores.py, not from CSV)
+-- Ranks in the latest published run and their change since the previous one;
+-- only the latest run's rows are kept
+CREATE TABLE rank_movements (
+  rank_movement_id SERIAL PRIMARY KEY,
+  run_id INT NOT NULL REFERENCES scoring_runs(run_id) ON DELETE CASCADE,
+  previous_run_id INT,
+  company_id INT NOT NULL REFERENCES companies(company_id) ON DELETE CASCADE,
+  sector_id INT REFERENCES sectors(id) ON DELETE CASCADE,
+  sector_score NUMERIC,
+  global_score NUMERIC,
+  sector_rank INT,
+  overall_rank INT,
+  previous_sector_rank INT,
+  previous_overall_rank INT,
+  sector_rank_change INT,   -- previous - current: positive = moved up
+  overall_rank_change INT,
+  sector_score_change NUMERIC,
+  global_score_change NUMERIC,
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE (run_id, company_id)
+);
+
+-- SCORE_DISTRIBUTIONS table (written by compute_scores.py, not from CSV)
+-- Quantiles and histogram of sector/global scores and of each metric's
+-- normalized values, per sector (sector_id NULL = all companies)
+CREATE TABLE score_distributions (
+  distribution_id SERIAL PRIMARY KEY,
+  run_id INT NOT NULL REFERENCES scoring_runs(run_id) ON DELETE CASCADE,
+  sector_id INT REFERENCES sectors(id) ON DELETE CASCADE,
+  subject TEXT NOT NULL CHECK (subject IN ('sector_score', 'global_score', 'metric')),
+  metric_id INT REFERENCES metrics(metric_id) ON DELETE CASCADE,
+  count INT NOT NULL,
+  mean DOUBLE PRECISION,
+  stdev DOUBLE PRECISION,
+  min_value DOUBLE PRECISION,
+  max_value DOUBLE PRECISION,
+  quantiles JSON,
+  histogram_min DOUBLE PRECISION,
+  histogram_max DOUBLE PRECISION,
+  histogram JSON,
+  computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for performance
 CREATE INDEX idx_company_metrics_company ON company_metrics(company_id);
 CREATE INDEX idx_company_metrics_metric ON company_metrics(metric_id);
 CREATE INDEX idx_companies_sector ON companies(sector_id);
 CREATE INDEX idx_sector_metrics_sector ON sector_metrics(sector_id);
 CREATE INDEX idx_scores_company ON scores(company_id);
+CREATE INDEX idx_profile_scores_rank ON profile_scores(profile_id, overall_rank);
+CREATE INDEX idx_rank_movements_sector ON rank_movements(sector_id, sector_rank_change);
+CREATE INDEX idx_rank_movements_overall ON rank_movements(overall_rank_change);
+CREATE INDEX idx_rank_movements_company ON rank_movements(company_id);
+CREATE INDEX idx_score_distributions_sector ON score_distributions(sector_id);
 
 -- Grant permissions to greenrank_user
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO greenrank_user;
@@ -0,0 +1,114 @@
+"""
+Connection pool and statement-timeout settings shared by the Flask app
+(sync, psycopg2) and the ASGI app (async, asyncpg), plus pool metrics.
+
+Pool sizes and the timeout only apply to Postgres; other databases (the
+SQLite stand-in used by loadtest.py) keep SQLAlchemy's defaults.
+"""
+import weakref
+
+from sqlalchemy import event
+
+from config import (DB_POOL_SIZE, DB_MAX_OVERFLOW, ASYNC_DB_POOL_SIZE, ASYNC_DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+                    DB_POOL_RECYCLE, DB_STATEMENT_TIMEOUT_MS)
+
+# Postgres SQLSTATE for a statement cancelled by statement_timeout
+QUERY_CANCELED = '57014'
+
+
+def is_postgres(uri):
+    return uri.startswith('postgresql')
+
+
+def engine_options(uri, statement_timeout_ms=DB_STATEMENT_TIMEOUT_MS):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the sync (psycopg2) engine. Batch scripts
+    pass statement_timeout_ms=0: their statements run far longer than a request.
+    """
+    if not is_postgres(uri):
+        return {}
+
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+    if statement_timeout_ms:
+        options['connect_args'] = {'options': f"-c statement_timeout={statement_timeout_ms}"}
+    return options
+
+
+def async_database_uri(uri):
+    """Async-driver equivalent of a sync database URI"""
+    if uri.startswith('postgresql://') or uri.startswith('postgresql+psycopg2://'):
+        return 'postgresql+asyncpg://' + uri.split('://', 1)[1]
+    if uri.startswith('sqlite://') or uri.startswith('sqlite+pysqlite://'):
+        return 'sqlite+aiosqlite://' + uri.split('://', 1)[1]
+    return uri
+
+
+def async_engine_options(uri):
+    """create_async_engine options for the async (asyncpg) engine"""
+    if not is_postgres(uri):
+        return {}
+
+    options = {
+        'pool_size': ASYNC_DB_POOL_SIZE,
+        'max_overflow': ASYNC_DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+    if DB_STATEMENT_TIMEOUT_MS:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(DB_STATEMENT_TIMEOUT_MS)}}
+    return options
+
+
+def is_statement_timeout(error):
+    """True if a DBAPIError was raised because statement_timeout cancelled the query"""
+    orig = getattr(error, 'orig', None)
+    return QUERY_CANCELED in (getattr(orig, 'pgcode', None), getattr(orig, 'sqlstate', None))
+
+
+# Event counters per tracked engine: {engine: {'connects': n, ...}}
+_counters = weakref.WeakKeyDictionary()
+
+
+def track_pool(engine):
+    """
+    Count connections opened, checked out and invalidated on an engine's pool
+    (for an AsyncEngine pass engine.sync_engine). Safe to call more than once.
+    """
+    if engine in _counters:
+        return
+
+    counters = _counters[engine] = {'connects': 0, 'checkouts': 0, 'invalidated': 0}
+
+    def count(name):
+        def listener(*args):
+            counters[name] += 1
+        return listener
+
+    event.listen(engine, 'connect', count('connects'))
+    event.listen(engine, 'checkout', count('checkouts'))
+    event.listen(engine, 'invalidate', count('invalidated'))
+
+
+def pool_stats(engine):
+    """
+    Current size and usage of an engine's pool, plus the counters from
+    track_pool when the engine is tracked
+    """
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+
+    # QueuePool gauges; other pool classes don't have all of them
+    for name in ('size', 'checkedin', 'checkedout', 'overflow', 'timeout'):
+        gauge = getattr(pool, name, None)
+        if callable(gauge):
+            stats[name] = gauge()
+
+    stats.update(_counters.get(engine, {}))
+    return stats
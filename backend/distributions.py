@@ -0,0 +1,178 @@
+"""
+Score and metric distributions per sector and globally, precomputed when a
+scoring run is published (compute_scores.py) and served by
+/api/sectors/<id>/distribution and /api/distribution.
+
+For each scope (a sector, or every company) and subject (sector scores,
+global scores, and each metric's normalized values from score_components) a
+score_distributions row holds the count, mean, sample stdev, min/max,
+quantiles and a histogram with HISTOGRAM_BINS equal-width buckets: 0-100 for
+scores, min-max for metric values.
+
+On Postgres everything is aggregated in the database (percentile_cont,
+width_bucket); only one row per scope/subject and per histogram bucket comes
+back. Other databases (the SQLite stand-in) have neither, so there the values
+are loaded and aggregated with numpy instead, with the same semantics.
+"""
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import insert, select, text
+
+from models import db, Company, Score, ScoreComponent, ScoreDistribution
+
+HISTOGRAM_BINS = 10
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+SCORE_SUBJECTS = ('sector_score', 'global_score')
+
+# Every non-null value once per sector and once for the global scope
+# (sector_id NULL), tagged with its subject
+SCOPED_VALUES_CTE = """
+    WITH vals AS (
+        SELECT c.sector_id, 'sector_score' AS subject, CAST(NULL AS INT) AS metric_id,
+               CAST(s.sector_score AS FLOAT8) AS value
+        FROM scores s JOIN companies c ON c.company_id = s.company_id
+        UNION ALL
+        SELECT c.sector_id, 'global_score', NULL, CAST(s.global_score AS FLOAT8)
+        FROM scores s JOIN companies c ON c.company_id = s.company_id
+        UNION ALL
+        SELECT c.sector_id, 'metric', sc.metric_id, CAST(sc.normalized_value AS FLOAT8)
+        FROM score_components sc JOIN companies c ON c.company_id = sc.company_id
+    ),
+    scoped AS (
+        SELECT sector_id, subject, metric_id, value FROM vals WHERE value IS NOT NULL
+        UNION ALL
+        SELECT CAST(NULL AS INT), subject, metric_id, value FROM vals WHERE value IS NOT NULL
+    )
+"""
+
+SUMMARY_SQL = text(SCOPED_VALUES_CTE + """
+    SELECT sector_id, subject, metric_id, COUNT(*) AS count, AVG(value) AS mean, STDDEV_SAMP(value) AS stdev,
+           MIN(value) AS min_value, MAX(value) AS max_value,
+           percentile_cont(CAST(:quantiles AS FLOAT8[])) WITHIN GROUP (ORDER BY value) AS quantiles
+    FROM scoped
+    GROUP BY sector_id, subject, metric_id
+""")
+
+HISTOGRAM_SQL = text(SCOPED_VALUES_CTE + """,
+    bounds AS (
+        SELECT sector_id, subject, metric_id,
+               CASE WHEN subject = 'metric' THEN MIN(value) ELSE 0 END AS lo,
+               CASE WHEN subject = 'metric' THEN MAX(value) ELSE 100 END AS hi
+        FROM scoped
+        GROUP BY sector_id, subject, metric_id
+    )
+    SELECT s.sector_id, s.subject, s.metric_id,
+           CASE WHEN b.hi > b.lo
+                THEN LEAST(GREATEST(width_bucket(s.value, b.lo, b.hi, :bins), 1), :bins)
+                ELSE 1 END AS bucket,
+           COUNT(*) AS count
+    FROM scoped s
+    JOIN bounds b ON b.subject = s.subject
+                 AND b.sector_id IS NOT DISTINCT FROM s.sector_id
+                 AND b.metric_id IS NOT DISTINCT FROM s.metric_id
+    GROUP BY s.sector_id, s.subject, s.metric_id, bucket
+""")
+
+
+def histogram_bounds(subject, min_value, max_value):
+    return (min_value, max_value) if subject == 'metric' else (0.0, 100.0)
+
+
+def summarize_in_database(bins=HISTOGRAM_BINS):
+    """Distribution rows aggregated by Postgres"""
+    rows = {}
+    for r in db.session.execute(SUMMARY_SQL, {'quantiles': list(QUANTILES)}):
+        lo, hi = histogram_bounds(r.subject, r.min_value, r.max_value)
+        rows[(r.sector_id, r.subject, r.metric_id)] = {
+            'sector_id': r.sector_id,
+            'subject': r.subject,
+            'metric_id': r.metric_id,
+            'count': r.count,
+            'mean': r.mean,
+            'stdev': r.stdev,
+            'min_value': r.min_value,
+            'max_value': r.max_value,
+            'quantiles': dict(zip(QUANTILES, r.quantiles)),
+            'histogram_min': lo,
+            'histogram_max': hi,
+            'histogram': [0] * bins
+        }
+
+    for r in db.session.execute(HISTOGRAM_SQL, {'bins': bins}):
+        rows[(r.sector_id, r.subject, r.metric_id)]['histogram'][r.bucket - 1] = r.count
+
+    return list(rows.values())
+
+
+def summarize_values(sector_id, subject, metric_id, values, bins=HISTOGRAM_BINS):
+    """One distribution row from a list of values (numpy fallback)"""
+    values = np.asarray(values, dtype=float)
+    lo, hi = histogram_bounds(subject, float(values.min()), float(values.max()))
+
+    # Same buckets as width_bucket, with the top edge in the last bucket
+    if hi > lo:
+        buckets = np.clip(np.floor((values - lo) / (hi - lo) * bins).astype(int), 0, bins - 1)
+    else:
+        buckets = np.zeros(len(values), dtype=int)
+
+    return {
+        'sector_id': sector_id,
+        'subject': subject,
+        'metric_id': metric_id,
+        'count': len(values),
+        'mean': float(values.mean()),
+        'stdev': float(values.std(ddof=1)) if len(values) > 1 else None,
+        'min_value': float(values.min()),
+        'max_value': float(values.max()),
+        'quantiles': dict(zip(QUANTILES, np.quantile(values, QUANTILES).tolist())),  # = percentile_cont
+        'histogram_min': lo,
+        'histogram_max': hi,
+        'histogram': np.bincount(buckets, minlength=bins).tolist()
+    }
+
+
+def summarize_in_python(bins=HISTOGRAM_BINS):
+    """Distribution rows aggregated with numpy, for databases without percentile_cont"""
+    groups = defaultdict(list)
+
+    def add(sector_id, subject, metric_id, value):
+        if value is not None:
+            groups[(sector_id, subject, metric_id)].append(float(value))
+            groups[(None, subject, metric_id)].append(float(value))
+
+    scores = select(Company.sector_id, Score.sector_score, Score.global_score).join(
+        Company, Company.company_id == Score.company_id
+    )
+    for sector_id, sector_score, global_score in db.session.execute(scores):
+        add(sector_id, 'sector_score', None, sector_score)
+        add(sector_id, 'global_score', None, global_score)
+
+    components = select(Company.sector_id, ScoreComponent.metric_id, ScoreComponent.normalized_value).join(
+        Company, Company.company_id == ScoreComponent.company_id
+    )
+    for sector_id, metric_id, value in db.session.execute(components):
+        add(sector_id, 'metric', metric_id, value)
+
+    return [summarize_values(*key, values, bins=bins) for key, values in groups.items()]
+
+
+def publish_distributions(run, calculated_at):
+    """
+    Replace score_distributions with the distributions of the scores and
+    score components being published in `run` (same transaction)
+    """
+    if db.engine.dialect.name == 'postgresql':
+        rows = summarize_in_database()
+    else:
+        rows = summarize_in_python()
+
+    for row in rows:
+        row['quantiles'] = {f"p{round(q * 100)}": value for q, value in row['quantiles'].items()}
+        row['run_id'] = run.run_id
+        row['computed_at'] = calculated_at
+
+    ScoreDistribution.query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(ScoreDistribution), rows)
+    return len(rows)
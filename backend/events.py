@@ -0,0 +1,170 @@
+"""
+Server-sent events: push "scoring run N published" to clients instead of
+having them poll.
+
+compute_scores.py calls notify_published() once a run (and its artifacts) are
+published. Each API process runs one listener thread that receives those
+notifications and fans them out to its connected /api/events clients:
+
+- Postgres: LISTEN/NOTIFY on the greenrank_scores channel, over one dedicated
+  connection per process (outside the pool)
+- Anything else (the SQLite stand-in): a UDP datagram to 127.0.0.1 on
+  EVENTS_UDP_PORT. Only one process can bind the port, so this stand-in
+  reaches a single API process; use Postgres for several workers.
+
+The notification only carries the run id; the listener reads the compact rank
+diff from rank_movements once per process and every client gets the same
+event. Clients refetch only when the run id differs from what they loaded.
+"""
+import json
+import logging
+import select
+import socket
+import threading
+import time
+
+from sqlalchemy import text
+
+from config import EVENTS_UDP_PORT, EVENTS_MAX_DIFF
+from models import db, RankMovement
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'greenrank_scores'
+
+# Seconds to wait before reconnecting after the listener fails
+RECONNECT_DELAY = 5.0
+
+
+def is_postgres(engine):
+    return engine.dialect.name == 'postgresql'
+
+
+def notify_published(run_id):
+    """Tell API processes that scoring run `run_id` has been published"""
+    payload = json.dumps({'run_id': run_id})
+
+    if is_postgres(db.engine):
+        db.session.execute(text("SELECT pg_notify(:channel, :payload)"), {'channel': CHANNEL, 'payload': payload})
+        db.session.commit()
+        return
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(payload.encode(), ('127.0.0.1', EVENTS_UDP_PORT))
+
+
+def generation_event(run_id, max_diff=EVENTS_MAX_DIFF):
+    """
+    The event sent for a published run: its id and, if at most max_diff
+    companies changed overall rank, [company_id, overall_rank, sector_rank] for
+    each of them (new companies included). `changed` is always the full count.
+    """
+    changed = RankMovement.query.filter(
+        RankMovement.run_id == run_id,
+        (RankMovement.overall_rank_change != 0) | RankMovement.overall_rank_change.is_(None)
+    ).order_by(RankMovement.overall_rank)
+
+    event = {'run_id': run_id, 'changed': changed.count()}
+    if event['changed'] <= max_diff:
+        event['ranks'] = [[m.company_id, m.overall_rank, m.sector_rank] for m in changed]
+    return event
+
+
+def format_sse(data, event=None, event_id=None):
+    """One server-sent event (data is JSON-encoded)"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBroker:
+    """
+    Fans published-run events out to the subscribers of one process, and runs
+    the listener thread that receives notify_published() (started on the first
+    subscription, so scripts that build the app don't listen)
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._listener = None
+        self.last_event = None
+
+    def subscribe(self, callback):
+        """Call callback(event) for each published run until unsubscribe(callback)"""
+        with self._lock:
+            self._subscribers.add(callback)
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='greenrank-events', daemon=True)
+                self._listener.start()
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers.discard(callback)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, run_id):
+        """Build the event for run_id and hand it to every subscriber"""
+        with self.app.app_context():
+            event = generation_event(run_id)
+            db.session.remove()
+
+        self.last_event = event
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(event)
+        logger.info(f"Run {run_id} published to {len(subscribers)} event subscribers")
+
+    def _handle(self, payload):
+        try:
+            self.publish(int(json.loads(payload)['run_id']))
+        except Exception as e:
+            logger.error(f"Error handling score notification {payload!r}: {e}")
+
+    def _listen(self):
+        with self.app.app_context():
+            engine = db.engine
+
+        while True:
+            try:
+                if is_postgres(engine):
+                    self._listen_postgres(engine)
+                else:
+                    self._listen_udp()
+            except Exception as e:
+                logger.error(f"Score notification listener failed, reconnecting: {e}")
+            time.sleep(RECONNECT_DELAY)
+
+    def _listen_postgres(self, engine):
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        conn = engine.dialect.dbapi.connect(*cargs, **cparams)
+        try:
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {CHANNEL}")
+            logger.info(f"Listening for score notifications on {CHANNEL}")
+
+            while True:
+                if select.select([conn], [], [], 60.0)[0]:
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _listen_udp(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.bind(('127.0.0.1', EVENTS_UDP_PORT))
+            logger.info(f"Listening for score notifications on udp://127.0.0.1:{EVENTS_UDP_PORT}")
+
+            while True:
+                payload, _ = sock.recvfrom(65536)
+                self._handle(payload.decode())
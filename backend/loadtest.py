@@ -0,0 +1,304 @@
+"""
+Load-test harness for the GreenRank API
+
+Replays a weighted mix of leaderboard, search, company detail and sector
+leaderboard requests at a fixed concurrency and reports throughput plus
+p50/p95/p99 latency per route. Fails (exit code 1) when any request failed,
+or when a route's p95/p99 regresses past the stored baseline by more than
+the allowed tolerance. A run with failed requests is never stored as the
+baseline.
+
+By default a local stand-in database (SQLite) is seeded from db/data/*.csv,
+scored with compute_scores.py and served from an in-process threaded server.
+
+Usage:
+    python loadtest.py                                   # stand-in DB, local server
+    python loadtest.py --concurrency 32 --requests 5000
+    python loadtest.py --database-uri postgresql://...    # local server, real DB
+    python loadtest.py --target http://staging:5000       # already-running API
+    python loadtest.py --update-baseline                  # store current results
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'data')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_baseline.json')
+
+# Relative share of each route in the replayed mix
+ROUTE_MIX = {
+    'leaderboard': 40,
+    'company_detail': 25,
+    'search': 20,
+    'sector_leaderboard': 15,
+}
+
+
+# ===== STAND-IN DATABASE =====
+
+def read_csv(file_name):
+    """Yield CSV rows with empty strings converted to None"""
+    with open(os.path.join(DATA_DIR, file_name), encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            yield {k: (v if v != '' else None) for k, v in row.items()}
+
+
+def seed_database(app):
+    """Create all tables and load the CSV data, then compute scores"""
+    from models import db, Sector, Metric, SectorMetric, Company, CompanyMetric, WeightProfile, ProfileWeight
+    from compute_scores import compute_all_scores
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        for row in read_csv('sectors.csv'):
+            db.session.add(Sector(**row))
+        for row in read_csv('metrics.csv'):
+            row['invert_score'] = row['invert_score'] == 'True'
+            db.session.add(Metric(**row))
+        for row in read_csv('sector_metrics.csv'):
+            db.session.add(SectorMetric(**row))
+        for row in read_csv('companies.csv'):
+            db.session.add(Company(**row))
+        for row in read_csv('company_metrics.csv'):
+            db.session.add(CompanyMetric(**row))
+        for row in read_csv('weight_profiles.csv'):
+            db.session.add(WeightProfile(**row))
+        for row in read_csv('profile_weights.csv'):
+            db.session.add(ProfileWeight(**row))
+        db.session.commit()
+
+        # The scorer is chatty; keep the load-test output readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            compute_all_scores()
+
+
+def start_local_server(app):
+    """Serve the app from a background thread; returns (base_url, server)"""
+    from werkzeug.serving import make_server
+
+    # Per-request access logs would swamp the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+# ===== REQUEST MIX =====
+
+def fetch_json(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def build_request_plan(base_url, total, rng):
+    """
+    Build the list of (route, url) pairs to replay. Company ids, names and
+    sector ids are discovered from the API so the mix hits real rows.
+    """
+    companies = fetch_json(f"{base_url}/api/companies?limit=100000&fields=company_id,name")['companies']
+    sectors = fetch_json(f"{base_url}/api/sectors")
+
+    company_ids = [c['company_id'] for c in companies]
+    search_terms = [c['name'].strip()[:4] for c in companies if c['name'] and c['name'].strip()]
+    sector_ids = [s['id'] for s in sectors]
+
+    def make_url(route):
+        if route == 'leaderboard':
+            return f"{base_url}/api/leaderboard?limit={rng.choice([10, 50, 290])}"
+        if route == 'company_detail':
+            return f"{base_url}/api/companies/{rng.choice(company_ids)}"
+        if route == 'search':
+            return f"{base_url}/api/companies/search?q={urllib.parse.quote(rng.choice(search_terms))}"
+        if route == 'sector_leaderboard':
+            return f"{base_url}/api/sectors/{rng.choice(sector_ids)}/leaderboard"
+        raise ValueError(route)
+
+    routes = rng.choices(list(ROUTE_MIX), weights=list(ROUTE_MIX.values()), k=total)
+    return [(route, make_url(route)) for route in routes]
+
+
+def timed_request(route, url):
+    """Issue one request; returns (route, latency_seconds, ok)"""
+    request = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            response.read()
+            ok = response.status == 200
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return route, time.perf_counter() - start, ok
+
+
+def run_load(plan, concurrency):
+    """Replay the plan with `concurrency` workers; returns (results, elapsed)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda item: timed_request(*item), plan))
+    return results, time.perf_counter() - start
+
+
+# ===== REPORTING =====
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(results, elapsed):
+    """Per-route request counts, errors, throughput and latency percentiles (ms)"""
+    by_route = {}
+    for route, latency, ok in results:
+        by_route.setdefault(route, []).append((latency, ok))
+
+    summary = {}
+    for route, samples in sorted(by_route.items()):
+        latencies = sorted(latency * 1000.0 for latency, _ in samples)
+        summary[route] = {
+            'requests': len(samples),
+            'errors': sum(1 for _, ok in samples if not ok),
+            'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+        }
+    return summary
+
+
+def print_summary(summary, elapsed, concurrency):
+    total = sum(r['requests'] for r in summary.values())
+    print("=" * 80)
+    print(f"LOAD TEST RESULTS ({total} requests, concurrency {concurrency}, {elapsed:.2f}s)")
+    print("=" * 80)
+    print(f"{'Route':20s} {'Reqs':>6s} {'Errs':>5s} {'Req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}")
+    print("-" * 80)
+    for route, r in summary.items():
+        print(f"{route:20s} {r['requests']:6d} {r['errors']:5d} {r['throughput']:8.1f} "
+              f"{r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f}")
+    print("-" * 80)
+    print(f"{'TOTAL':20s} {total:6d} {'':5s} {total / elapsed if elapsed else 0.0:8.1f}")
+
+
+def request_errors(summary):
+    """Return a human-readable message per route with failed requests (empty = none)"""
+    return [f"{route}: {r['errors']} failed requests" for route, r in summary.items() if r['errors']]
+
+
+def check_regressions(summary, baseline, tolerance):
+    """Return a list of human-readable regression messages (empty = pass)"""
+    failures = []
+    for route, r in summary.items():
+        base = baseline.get('routes', {}).get(route)
+        if not base:
+            continue
+        for key in ('p95', 'p99'):
+            limit = base[key] * (1 + tolerance)
+            if r[key] > limit:
+                failures.append(f"{route}: {key} {r[key]:.2f}ms exceeds baseline {base[key]:.2f}ms (+{tolerance:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GreenRank API load test")
+    parser.add_argument('--target', help="Base URL of a running API (skips the local server)")
+    parser.add_argument('--database-uri', help="Database for the local server (default: seeded SQLite stand-in)")
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000, help="Total requests to replay")
+    parser.add_argument('--warmup', type=int, default=50, help="Unmeasured requests sent first")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for the request mix")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95/p99 regression (0.25 = 25%%)")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the new baseline")
+    args = parser.parse_args()
+
+    server = None
+    if args.target:
+        base_url = args.target.rstrip('/')
+    else:
+        from app import create_app
+
+        if args.database_uri:
+            app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_uri})
+        else:
+            db_path = os.path.join(tempfile.mkdtemp(prefix='greenrank-loadtest-'), 'greenrank.db')
+            app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}"})
+            print(f"Seeding stand-in database at {db_path}...")
+            seed_database(app)
+
+        base_url, server = start_local_server(app)
+        print(f"Serving app at {base_url}")
+
+    rng = random.Random(args.seed)
+    try:
+        if args.warmup:
+            run_load(build_request_plan(base_url, args.warmup, rng), args.concurrency)
+
+        plan = build_request_plan(base_url, args.requests, rng)
+        results, elapsed = run_load(plan, args.concurrency)
+    finally:
+        if server:
+            server.shutdown()
+
+    summary = summarize(results, elapsed)
+    print_summary(summary, elapsed, args.concurrency)
+
+    errors = request_errors(summary)
+    if errors:
+        print("\nFAILED REQUESTS:")
+        for error in errors:
+            print(f"  - {error}")
+        if args.update_baseline:
+            print(f"\nBaseline not written to {args.baseline}")
+        return 1
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'concurrency': args.concurrency, 'routes': summary}, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to store one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if baseline.get('concurrency') != args.concurrency:
+        print(f"\nWarning: baseline was recorded at concurrency {baseline.get('concurrency')}")
+
+    failures = check_regressions(summary, baseline, args.tolerance)
+    if failures:
+        print("\nREGRESSIONS:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+
+    print("\nAll routes within baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
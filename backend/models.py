@@ -1,8 +1,35 @@
+import threading
+import time
+from collections import defaultdict
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, load_only
 from datetime import datetime
 
 db = SQLAlchemy()
 
+# Serializable company fields, in output order. Each getter only touches the
+# columns it needs (sector names come from the reference-data cache), so a
+# narrowed `fields` list never triggers lazy loads for columns that were left
+# out of the SQL projection.
+COMPANY_FIELDS = {
+    'company_id': lambda c: c.company_id,
+    'name': lambda c: c.name,
+    'sector_id': lambda c: c.sector_id,
+    'sector_name': lambda c: reference_data().sector_name(c.sector_id),
+    'turnover': lambda c: float(c.turnover) if c.turnover else None,
+    'country': lambda c: c.country,
+    'description': lambda c: c.description,
+    'website': lambda c: c.website,
+}
+
+# Fields taken from the company's Score row
+SCORE_FIELDS = {
+    'sector_score': lambda s: float(s.sector_score) if s.sector_score else None,
+    'global_score': lambda s: float(s.global_score) if s.global_score else None,
+    'last_calculated': lambda s: s.last_calculated.isoformat() if s.last_calculated else None,
+}
+
 class Sector(db.Model):
     __tablename__ = "sectors"
     
@@ -30,6 +57,7 @@ class Metric(db.Model):
     invert_score = db.Column(db.Boolean, default=False)  # FALSE = higher is better
     description = db.Column(db.Text)
     source = db.Column(db.Text)
+    scoring_mode = db.Column(db.Text, nullable=False, default='zscore')  # 'zscore' or 'percentile'
     
     # Relationships
     sector_metrics = db.relationship("SectorMetric", back_populates="metric", lazy='dynamic')
@@ -42,7 +70,8 @@ class Metric(db.Model):
             'unit': self.unit,
             'invert_score': self.invert_score,
             'description': self.description,
-            'source': self.source
+            'source': self.source,
+            'scoring_mode': self.scoring_mode
         }
 
 class SectorMetric(db.Model):
@@ -81,37 +110,67 @@ class Company(db.Model):
     metrics = db.relationship("CompanyMetric", back_populates="company", lazy='dynamic')
     score = db.relationship("Score", back_populates="company", uselist=False)  # One score per company
     
-    def to_dict(self, include_score=True):
+    def to_dict(self, include_score=True, fields=None):
+        """
+        Serialize the company. `fields` optionally restricts the output to a
+        subset of COMPANY_FIELDS / SCORE_FIELDS keys.
+        """
         result = {
-            'company_id': self.company_id,
-            'name': self.name,
-            'sector_id': self.sector_id,
-            'sector_name': self.sector.sector_name if self.sector else None,
-            'turnover': float(self.turnover) if self.turnover else None,
-            'country': self.country,
-            'description': self.description,
-            'website': self.website
+            key: getter(self)
+            for key, getter in COMPANY_FIELDS.items()
+            if fields is None or key in fields
         }
         
-        if include_score and self.score:
-            result['sector_score'] = float(self.score.sector_score) if self.score.sector_score else None
-            result['global_score'] = float(self.score.global_score) if self.score.global_score else None
-            result['last_calculated'] = self.score.last_calculated.isoformat() if self.score.last_calculated else None
+        score_fields = [key for key in SCORE_FIELDS if fields is None or key in fields]
+        if include_score and score_fields and self.score:
+            for key in score_fields:
+                result[key] = SCORE_FIELDS[key](self.score)
         
         return result
     
-    def to_dict_detailed(self):
-        """Detailed view with all metrics"""
+    @classmethod
+    def query_options(cls, fields=None, include_score=True):
+        """
+        Loader options that narrow the SQL projection to what to_dict(fields)
+        will read, and eager-load the score row it needs.
+        """
+        def wanted(key):
+            return fields is None or key in fields
+        
+        columns = [cls.company_id] + [
+            getattr(cls, key) for key in COMPANY_FIELDS
+            if key not in ('company_id', 'sector_name') and wanted(key)
+        ]
+        if wanted('sector_name') and not wanted('sector_id'):
+            columns.append(cls.sector_id)
+        options = [load_only(*columns)]
+        
+        if include_score and any(wanted(key) for key in SCORE_FIELDS):
+            options.append(joinedload(cls.score))
+        
+        return options
+    
+    def to_dict_detailed(self, company_metrics=None):
+        """
+        Detailed view with all metrics. `company_metrics` optionally supplies
+        this company's CompanyMetric rows when they were fetched in bulk;
+        otherwise they are queried.
+        """
         result = self.to_dict(include_score=True)
         
+        if company_metrics is None:
+            company_metrics = self.metrics
+        
         # Add all metrics
+        metrics = reference_data().metrics
         metrics_list = []
-        for cm in self.metrics:
+        for cm in company_metrics:
+            metric = metrics.get(cm.metric_id, {})
             metrics_list.append({
                 'metric_id': cm.metric_id,
-                'metric_name': cm.metric.metric_name,
+                'metric_name': metric.get('metric_name'),
                 'value': float(cm.value) if cm.value else None,
-                'unit': cm.metric.unit,
+                'unit': metric.get('unit'),
                 'year': cm.year
             })
         
@@ -132,13 +191,14 @@ class CompanyMetric(db.Model):
     metric = db.relationship("Metric", back_populates="company_metrics")
     
     def to_dict(self):
+        metric = reference_data().metrics.get(self.metric_id, {})
         return {
             'id': self.id,
             'company_id': self.company_id,
             'metric_id': self.metric_id,
-            'metric_name': self.metric.metric_name if self.metric else None,
+            'metric_name': metric.get('metric_name'),
             'value': float(self.value) if self.value else None,
-            'unit': self.metric.unit if self.metric else None,
+            'unit': metric.get('unit'),
             'year': self.year
         }
 
@@ -163,3 +223,388 @@ class Score(db.Model):
             'global_score': float(self.global_score) if self.global_score else None,
             'last_calculated': self.last_calculated.isoformat() if self.last_calculated else None
         }
+
+class WeightProfile(db.Model):
+    """
+    A named set of sector weights (e.g. "default", "climate-heavy").
+    Profiles override sector_metrics.weight per (sector, metric) through
+    ProfileWeight rows; anything not overridden uses the base weight.
+    """
+    __tablename__ = "weight_profiles"
+    
+    profile_id = db.Column(db.Integer, primary_key=True)
+    profile_name = db.Column(db.Text, unique=True, nullable=False)
+    description = db.Column(db.Text)
+    
+    # Relationships
+    weights = db.relationship("ProfileWeight", back_populates="profile", lazy='dynamic')
+    
+    def to_dict(self):
+        return {
+            'profile_id': self.profile_id,
+            'profile_name': self.profile_name,
+            'description': self.description
+        }
+
+class ProfileWeight(db.Model):
+    __tablename__ = "profile_weights"
+    __table_args__ = (db.UniqueConstraint('profile_id', 'sector_id', 'metric_id'),)
+    
+    profile_weight_id = db.Column(db.Integer, primary_key=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey("weight_profiles.profile_id"), nullable=False)
+    sector_id = db.Column(db.Integer, db.ForeignKey("sectors.id"), nullable=False)
+    metric_id = db.Column(db.Integer, db.ForeignKey("metrics.metric_id"), nullable=False)
+    weight = db.Column(db.Numeric, default=0.0)
+    
+    # Relationships
+    profile = db.relationship("WeightProfile", back_populates="weights")
+    
+    def to_dict(self):
+        return {
+            'profile_weight_id': self.profile_weight_id,
+            'profile_id': self.profile_id,
+            'sector_id': self.sector_id,
+            'metric_id': self.metric_id,
+            'weight': float(self.weight) if self.weight else 0.0
+        }
+
+class ProfileScore(db.Model):
+    """Sector score and ranks for one company under one weighting profile"""
+    __tablename__ = "profile_scores"
+    __table_args__ = (db.UniqueConstraint('profile_id', 'company_id'),)
+    
+    profile_score_id = db.Column(db.Integer, primary_key=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey("weight_profiles.profile_id"), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.company_id"), nullable=False)
+    sector_score = db.Column(db.Numeric)
+    global_score = db.Column(db.Numeric)
+    sector_rank = db.Column(db.Integer)
+    overall_rank = db.Column(db.Integer)
+    last_calculated = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'profile_id': self.profile_id,
+            'company_id': self.company_id,
+            'sector_score': float(self.sector_score) if self.sector_score else None,
+            'global_score': float(self.global_score) if self.global_score else None,
+            'sector_rank': self.sector_rank,
+            'overall_rank': self.overall_rank,
+            'last_calculated': self.last_calculated.isoformat() if self.last_calculated else None
+        }
+
+class RankSensitivity(db.Model):
+    """
+    Rank distribution of a company under Monte Carlo perturbations of its
+    sector's weights (see sensitivity.py). Ranks are 1 = best.
+    """
+    __tablename__ = "rank_sensitivity"
+    
+    rank_sensitivity_id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.company_id"), nullable=False, unique=True)
+    samples = db.Column(db.Integer, nullable=False)
+    concentration = db.Column(db.Numeric)
+    sector_rank_median = db.Column(db.Integer)
+    sector_rank_p5 = db.Column(db.Integer)
+    sector_rank_p95 = db.Column(db.Integer)
+    overall_rank_median = db.Column(db.Integer)
+    overall_rank_p5 = db.Column(db.Integer)
+    overall_rank_p95 = db.Column(db.Integer)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'company_id': self.company_id,
+            'samples': self.samples,
+            'concentration': float(self.concentration) if self.concentration else None,
+            'sector_rank': {
+                'median': self.sector_rank_median,
+                'p5': self.sector_rank_p5,
+                'p95': self.sector_rank_p95
+            },
+            'overall_rank': {
+                'median': self.overall_rank_median,
+                'p5': self.overall_rank_p5,
+                'p95': self.overall_rank_p95
+            },
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+class ScoringRun(db.Model):
+    """
+    A published scoring run, with the input fingerprints it was computed from.
+    compute_scores.py compares against the latest run to skip unchanged sectors.
+    """
+    __tablename__ = "scoring_runs"
+    
+    run_id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    global_fingerprint = db.Column(db.Text)
+    sector_fingerprints = db.Column(db.JSON)  # {sector_id: fingerprint}
+    sectors_recomputed = db.Column(db.JSON)  # [sector_id, ...]
+    global_recomputed = db.Column(db.Boolean, default=True)
+    
+    def to_dict(self):
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'sectors_recomputed': self.sectors_recomputed or [],
+            'global_recomputed': self.global_recomputed
+        }
+
+
+class MetricDistribution(db.Model):
+    """
+    Sorted normalized comparison values for a percentile-mode metric, as used
+    by the last scoring run. sector_id is None for the global comparison set.
+    """
+    __tablename__ = "metric_distributions"
+    __table_args__ = (db.UniqueConstraint('metric_id', 'sector_id'),)
+    
+    distribution_id = db.Column(db.Integer, primary_key=True)
+    metric_id = db.Column(db.Integer, db.ForeignKey("metrics.metric_id"), nullable=False)
+    sector_id = db.Column(db.Integer, db.ForeignKey("sectors.id"))
+    sorted_values = db.Column(db.JSON, nullable=False)  # ascending
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ScoreComponent(db.Model):
+    """
+    One metric's part of a company's sector score, as computed by the last
+    scoring run. A company's contributions sum to its Score.sector_score.
+    """
+    __tablename__ = "score_components"
+    __table_args__ = (db.UniqueConstraint('company_id', 'metric_id'),)
+    
+    score_component_id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.company_id"), nullable=False)
+    metric_id = db.Column(db.Integer, db.ForeignKey("metrics.metric_id"), nullable=False)
+    normalized_value = db.Column(db.Numeric)
+    z_score = db.Column(db.Numeric)  # None for percentile metrics and undefined z
+    metric_score = db.Column(db.Numeric)
+    weight = db.Column(db.Numeric)
+    contribution = db.Column(db.Numeric)
+    last_calculated = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RankMovement(db.Model):
+    """
+    A company's ranks in the latest scoring run and how they moved since the
+    run before it (written by compute_scores.py when it publishes). Positive
+    rank changes are moves up; changes are None for companies that weren't
+    ranked before, and sector_rank_change also when the company changed sector.
+    """
+    __tablename__ = "rank_movements"
+    __table_args__ = (db.UniqueConstraint('run_id', 'company_id'),)
+    
+    rank_movement_id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey("scoring_runs.run_id"), nullable=False)
+    previous_run_id = db.Column(db.Integer)
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.company_id"), nullable=False)
+    sector_id = db.Column(db.Integer, db.ForeignKey("sectors.id"))
+    sector_score = db.Column(db.Numeric)
+    global_score = db.Column(db.Numeric)
+    sector_rank = db.Column(db.Integer)
+    overall_rank = db.Column(db.Integer)
+    previous_sector_rank = db.Column(db.Integer)
+    previous_overall_rank = db.Column(db.Integer)
+    sector_rank_change = db.Column(db.Integer)
+    overall_rank_change = db.Column(db.Integer)
+    sector_score_change = db.Column(db.Numeric)
+    global_score_change = db.Column(db.Numeric)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    company = db.relationship("Company")
+    
+    def to_dict(self):
+        def number(value):
+            return float(value) if value is not None else None
+        
+        return {
+            'company_id': self.company_id,
+            'company_name': self.company.name if self.company else None,
+            'sector_id': self.sector_id,
+            'sector_score': number(self.sector_score),
+            'global_score': number(self.global_score),
+            'sector_rank': self.sector_rank,
+            'overall_rank': self.overall_rank,
+            'previous_sector_rank': self.previous_sector_rank,
+            'previous_overall_rank': self.previous_overall_rank,
+            'sector_rank_change': self.sector_rank_change,
+            'overall_rank_change': self.overall_rank_change,
+            'sector_score_change': number(self.sector_score_change),
+            'global_score_change': number(self.global_score_change)
+        }
+
+
+class ScoreDistribution(db.Model):
+    """
+    Distribution of one subject in one scope as of the last scoring run (see
+    distributions.py). subject is 'sector_score', 'global_score' or 'metric'
+    (normalized values of metric_id); sector_id is None for all companies.
+    """
+    __tablename__ = "score_distributions"
+    
+    distribution_id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey("scoring_runs.run_id"), nullable=False)
+    sector_id = db.Column(db.Integer, db.ForeignKey("sectors.id"))
+    subject = db.Column(db.Text, nullable=False)
+    metric_id = db.Column(db.Integer, db.ForeignKey("metrics.metric_id"))
+    count = db.Column(db.Integer, nullable=False)
+    mean = db.Column(db.Float)
+    stdev = db.Column(db.Float)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    quantiles = db.Column(db.JSON)  # {"p10": ..., "p25": ..., "p50": ..., "p75": ..., "p90": ...}
+    histogram_min = db.Column(db.Float)
+    histogram_max = db.Column(db.Float)
+    histogram = db.Column(db.JSON)  # counts of equal-width buckets from histogram_min to histogram_max
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        counts = self.histogram or []
+        width = (self.histogram_max - self.histogram_min) / len(counts) if counts else 0.0
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'stdev': self.stdev,
+            'min': self.min_value,
+            'max': self.max_value,
+            'quantiles': self.quantiles,
+            'histogram': [
+                {
+                    'lower': self.histogram_min + i * width,
+                    'upper': self.histogram_min + (i + 1) * width,
+                    'count': count
+                }
+                for i, count in enumerate(counts)
+            ]
+        }
+
+
+# ===== REFERENCE DATA CACHE =====
+#
+# sectors, metrics and sector_metrics are tiny and rarely change, so each
+# process keeps one serialized copy instead of re-reading them per request
+# and per row. Writers (the importers and compute_scores.py) bump a version
+# row in cache_versions; processes check it at most every check_interval
+# seconds and reload when it changed.
+
+REFERENCE_DATA = 'reference'
+
+# Bumped by the importers when companies or their metrics are (re)loaded;
+# part of the generation of cached API responses (see queries.generation_query)
+COMPANY_DATA = 'companies'
+
+
+class CacheVersion(db.Model):
+    """Version stamp of a cached data set, bumped by whatever writes it"""
+    __tablename__ = "cache_versions"
+    
+    name = db.Column(db.Text, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    fingerprint = db.Column(db.Text)  # of the data at the last bump, if the writer provided one
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def current_cache_version(name):
+    """(version, updated_at) of a cached data set, or None if never bumped"""
+    row = db.session.query(CacheVersion.version, CacheVersion.updated_at).filter_by(name=name).first()
+    return tuple(row) if row else None
+
+
+def bump_cache_version(name, fingerprint=None):
+    """
+    Mark a cached data set as changed. If a fingerprint of the data is given
+    and matches the one stored at the last bump, nothing is written.
+    Returns True if the version was bumped. The caller commits.
+    """
+    row = db.session.get(CacheVersion, name)
+    if row is None:
+        db.session.add(CacheVersion(name=name, version=1, fingerprint=fingerprint, updated_at=datetime.utcnow()))
+        return True
+    
+    if fingerprint is not None and row.fingerprint == fingerprint:
+        return False
+    
+    row.version += 1
+    row.fingerprint = fingerprint
+    row.updated_at = datetime.utcnow()
+    return True
+
+
+class ReferenceData:
+    """Serialized snapshot of sectors, metrics and sector weights"""
+    
+    def __init__(self):
+        self.sectors = {s.id: s.to_dict() for s in Sector.query.order_by(Sector.id)}
+        self.metrics = {m.metric_id: m.to_dict() for m in Metric.query.order_by(Metric.metric_id)}
+        
+        self.sector_metrics = defaultdict(list)
+        for sm in SectorMetric.query.order_by(SectorMetric.sector_metric_id):
+            self.sector_metrics[sm.sector_id].append(sm.to_dict())
+    
+    def sector_name(self, sector_id):
+        sector = self.sectors.get(sector_id)
+        return sector['sector_name'] if sector else None
+
+
+class ReferenceCache:
+    """Read-through, process-wide ReferenceData cache (one per app)"""
+    
+    def __init__(self, check_interval=30.0):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._checked_at = 0.0
+    
+    def is_fresh(self):
+        """True if get() would return without touching the database"""
+        return self._data is not None and time.monotonic() - self._checked_at < self.check_interval
+    
+    def get(self):
+        if self.is_fresh():
+            return self._data
+        
+        with self._lock:
+            if self.is_fresh():
+                return self._data
+            
+            version = current_cache_version(REFERENCE_DATA)
+            if self._data is None or version != self._version:
+                self._data = ReferenceData()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._data
+    
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+
+def reference_data():
+    """The current app's ReferenceData snapshot"""
+    cache = current_app.extensions.get('reference_cache')
+    if cache is None:
+        cache = current_app.extensions.setdefault('reference_cache', ReferenceCache())
+    return cache.get()
+
+
+def invalidate_reference_data(fingerprint=None):
+    """
+    Invalidation hook for anything that writes sectors, metrics or
+    sector_metrics: drops this process's copy and bumps the shared version so
+    other processes reload too. With a fingerprint, only does so if the data
+    actually changed. Returns True if invalidated. The caller commits.
+    """
+    if not bump_cache_version(REFERENCE_DATA, fingerprint):
+        return False
+    
+    cache = current_app.extensions.get('reference_cache')
+    if cache:
+        cache.invalidate()
+    return True
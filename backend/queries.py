@@ -0,0 +1,168 @@
+"""
+Query builders and row serializers shared by the Flask app (app.py) and the
+ASGI app (asgi.py).
+
+Builders return SQLAlchemy select() statements, so the same query runs on the
+sync session (db.session.execute) and on an async session (await
+session.execute). Serializers turn the resulting rows into response dicts and
+must be called inside a Flask app context (they read the reference-data cache).
+"""
+from sqlalchemy import and_, func, select
+
+from models import (Company, Score, WeightProfile, ProfileScore, ScoringRun, CacheVersion, reference_data,
+                    COMPANY_FIELDS, SCORE_FIELDS, COMPANY_DATA)
+
+# Fields accepted by the list endpoints' `fields` parameter
+LIST_FIELDS = list(COMPANY_FIELDS) + list(SCORE_FIELDS)
+LEADERBOARD_FIELDS = ['company_id', 'name', 'sector_id', 'sector_name', 'sector_score', 'global_score', 'turnover']
+
+
+def split_fields(raw, allowed):
+    """
+    Parse a comma-separated `fields` value.
+    Returns (fields, error); fields is None when the value is empty.
+    """
+    fields = [f.strip() for f in (raw or "").split(",") if f.strip()]
+
+    if not fields:
+        return None, None
+
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        return None, f"Unknown field(s): {', '.join(unknown)}"
+
+    return fields, None
+
+
+def profile_query(name):
+    """The weighting profile with this name"""
+    return select(WeightProfile).where(WeightProfile.profile_name == name)
+
+
+def latest_run_query():
+    """Id of the latest published scoring run (the generation of score-derived responses)"""
+    return select(func.max(ScoringRun.run_id))
+
+
+def generation_query():
+    """
+    (latest run id, company-data version, its updated_at) in one round trip:
+    cached responses are rebuilt when a run is published or companies are
+    re-imported without one
+    """
+    version = select(CacheVersion.version).where(CacheVersion.name == COMPANY_DATA)
+    updated_at = select(CacheVersion.updated_at).where(CacheVersion.name == COMPANY_DATA)
+    return select(latest_run_query().scalar_subquery(), version.scalar_subquery(), updated_at.scalar_subquery())
+
+
+def add_score_fields(result, score, fields=None):
+    """Copy SCORE_FIELDS from a Score/ProfileScore row into a serialized company"""
+    if score:
+        for key, getter in SCORE_FIELDS.items():
+            if fields is None or key in fields:
+                result[key] = getter(score)
+    return result
+
+
+def leaderboard_columns(score_model=Score):
+    """
+    Column expression for each leaderboard field. sector_name selects the
+    sector id; the name is filled in from the reference-data cache.
+    """
+    return {
+        'company_id': Company.company_id,
+        'name': Company.name,
+        'sector_id': Company.sector_id,
+        'sector_name': Company.sector_id,
+        'sector_score': score_model.sector_score,
+        'global_score': score_model.global_score,
+        'turnover': Company.turnover,
+    }
+
+
+def global_leaderboard_query(limit, fields=LEADERBOARD_FIELDS, profile=None):
+    """
+    Top `limit` companies by sector score, selecting only the requested
+    columns. With a profile, rows are ordered by (and carry) the overall rank
+    the scorer stored; otherwise ties are broken by company id.
+    """
+    score_model = ProfileScore if profile else Score
+    columns = leaderboard_columns(score_model)
+
+    stmt = select(*[columns[f].label(f) for f in fields]).select_from(score_model).join(
+        Company, Company.company_id == score_model.company_id
+    )
+    if profile:
+        stmt = stmt.add_columns(ProfileScore.overall_rank.label('stored_rank')).where(
+            ProfileScore.profile_id == profile.profile_id
+        ).order_by(ProfileScore.overall_rank)
+    else:
+        stmt = stmt.order_by(Score.sector_score.desc().nulls_last(), Company.company_id)
+
+    return stmt.limit(limit)
+
+
+def global_leaderboard_results(rows, fields=LEADERBOARD_FIELDS):
+    """Serialize global_leaderboard_query rows, adding each row's rank (the stored one for a profile)"""
+    ref = reference_data()
+    results = []
+    for i, row in enumerate(rows, 1):
+        result = {'rank': getattr(row, 'stored_rank', None) or i}
+        for f in fields:
+            value = getattr(row, f)
+            if f in ('sector_score', 'global_score', 'turnover'):
+                value = float(value) if value else None
+            elif f == 'sector_name':
+                value = ref.sector_name(value)
+            result[f] = value
+        results.append(result)
+
+    return results
+
+
+def sector_leaderboard_query(sector_id, fields=None, profile=None):
+    """
+    Companies in a sector, best sector score first (ties by company id). With
+    a profile, rows are (Company, ProfileScore or None) in the sector rank
+    order the scorer stored; otherwise (Company,) with its Score eager-loaded.
+    """
+    if profile:
+        return select(Company, ProfileScore).where(Company.sector_id == sector_id).outerjoin(
+            ProfileScore, and_(
+                ProfileScore.company_id == Company.company_id,
+                ProfileScore.profile_id == profile.profile_id
+            )
+        ).options(*Company.query_options(fields, include_score=False)).order_by(
+            ProfileScore.sector_rank.asc().nulls_last(), Company.company_id
+        )
+
+    return select(Company).where(Company.sector_id == sector_id).outerjoin(
+        Score, Score.company_id == Company.company_id
+    ).options(*Company.query_options(fields)).order_by(func.coalesce(Score.sector_score, 0).desc(), Company.company_id)
+
+
+def sector_leaderboard_results(sector_id, rows, fields=None, profile=None):
+    """Serialize sector_leaderboard_query rows into the sector leaderboard response"""
+    if profile:
+        results = [
+            add_score_fields(comp.to_dict(include_score=False, fields=fields), profile_score, fields)
+            for comp, profile_score in rows
+        ]
+        stored_ranks = [profile_score.sector_rank if profile_score else None for _, profile_score in rows]
+    else:
+        results = [row[0].to_dict(include_score=True, fields=fields) for row in rows]
+        stored_ranks = [None] * len(results)
+
+    # Add rank: the stored one for a profile (companies it didn't score follow)
+    for i, (company, stored_rank) in enumerate(zip(results, stored_ranks), 1):
+        company['rank'] = stored_rank or i
+
+    result = {
+        'sector_id': sector_id,
+        'sector_name': reference_data().sector_name(sector_id),
+        'companies': results
+    }
+    if profile:
+        result['profile'] = profile.profile_name
+
+    return result
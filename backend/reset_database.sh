@@ -13,6 +13,16 @@ echo ""
 # Drop and recreate schema
 echo "1. Dropping all existing tables..."
 sudo -u postgres psql -d "$DBNAME" << 'EOF'
+DROP TABLE IF EXISTS score_distributions CASCADE;
+DROP TABLE IF EXISTS rank_movements CASCADE;
+DROP TABLE IF EXISTS score_components CASCADE;
+DROP TABLE IF EXISTS cache_versions CASCADE;
+DROP TABLE IF EXISTS metric_distributions CASCADE;
+DROP TABLE IF EXISTS scoring_runs CASCADE;
+DROP TABLE IF EXISTS rank_sensitivity CASCADE;
+DROP TABLE IF EXISTS profile_scores CASCADE;
+DROP TABLE IF EXISTS profile_weights CASCADE;
+DROP TABLE IF EXISTS weight_profiles CASCADE;
 DROP TABLE IF EXISTS scores CASCADE;
 DROP TABLE IF EXISTS company_metrics CASCADE;
 DROP TABLE IF EXISTS sector_metrics CASCADE;
@@ -52,6 +62,20 @@ sudo -u postgres psql -d "$DBNAME" << EOF
 SELECT setval('company_metrics_id_seq', (SELECT MAX(id) FROM company_metrics));
 EOF
 
+echo "8. Importing weighting profiles..."
+sudo -u postgres psql -d "$DBNAME" << EOF
+-- Import with explicit ids
+\COPY weight_profiles(profile_id, profile_name, description) FROM '$DATA_DIR/weight_profiles.csv' DELIMITER ',' CSV HEADER;
+\COPY profile_weights(profile_weight_id, profile_id, sector_id, metric_id, weight) FROM '$DATA_DIR/profile_weights.csv' DELIMITER ',' CSV HEADER;
+
+-- Fix sequences
+SELECT setval('weight_profiles_profile_id_seq', (SELECT MAX(profile_id) FROM weight_profiles));
+SELECT setval('profile_weights_profile_weight_id_seq', (SELECT MAX(profile_weight_id) FROM profile_weights));
+EOF
+
+echo "9. Invalidating API reference-data and response caches..."
+sudo -u postgres psql -d "$DBNAME" -c "INSERT INTO cache_versions (name, version, updated_at) VALUES ('reference', 1, NOW()), ('companies', 1, NOW());"
+
 echo ""
 echo "=============================================================================="
 echo "✅ DATABASE RESET COMPLETE"
@@ -70,7 +94,11 @@ SELECT 'Sector-Metrics', COUNT(*) FROM sector_metrics
 UNION ALL
 SELECT 'Companies', COUNT(*) FROM companies
 UNION ALL
-SELECT 'Company Metrics', COUNT(*) FROM company_metrics;
+SELECT 'Company Metrics', COUNT(*) FROM company_metrics
+UNION ALL
+SELECT 'Weight Profiles', COUNT(*) FROM weight_profiles
+UNION ALL
+SELECT 'Profile Weights', COUNT(*) FROM profile_weights;
 EOF
 
 echo ""
@@ -82,6 +110,9 @@ echo "1. Compute sustainability scores:"
 echo "   $ source venv/bin/activate"
 echo "   $ python3 compute_scores.py"
 echo ""
-echo "2. Start the API server:"
+echo "2. (Optional) Analyse rank stability under weight perturbations:"
+echo "   $ python3 sensitivity.py"
+echo ""
+echo "3. Start the API server:"
 echo "   $ python3 app.py"
 echo ""
@@ -0,0 +1,151 @@
+"""
+Single-flight, stale-while-revalidate cache of serialized API responses.
+
+Leaderboard bodies only change when a scoring run is published (or the
+reference data is reloaded), but right after a run every client asks for them
+at once. Entries are tagged with the data generation they were built from:
+
+- same generation: the cached body is returned
+- new generation: the first request rebuilds it; identical requests that
+  arrive meanwhile get the previous generation's body if there is one (stale
+  while revalidate), or wait for the rebuild and share its result
+- a failed rebuild is raised to its waiters too, and the next request retries
+
+Coalescing is per process; each worker rebuilds a body at most once per
+generation. ResponseCache serves threads (the Flask app); AsyncResponseCache
+serves coroutines on one event loop (asgi.py).
+"""
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """A serialized response body, its ETag and the generation it was built from"""
+
+    def __init__(self, generation, body):
+        self.generation = generation
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+class Flight:
+    """One in-progress rebuild that other threads can wait on"""
+
+    def __init__(self, generation):
+        self.generation = generation
+        self._done = threading.Event()
+        self._entry = None
+        self._error = None
+
+    def finish(self, entry=None, error=None):
+        self._entry, self._error = entry, error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._entry
+
+
+class AsyncFlight(Flight):
+    """Flight awaited by coroutines on the event loop that started it"""
+
+    def __init__(self, generation):
+        super().__init__(generation)
+        self._done = asyncio.Event()
+
+    async def wait(self):
+        await self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._entry
+
+
+class ResponseCache:
+    """
+    LRU of CachedResponse per key (e.g. route and normalized query args), at
+    most max_entries long. Generations are compared with ==.
+    """
+
+    flight_class = Flight
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+
+    def _begin(self, key, generation):
+        """
+        Returns (entry, flight, leader). entry is set when it can be served
+        right away; otherwise the caller waits on flight, or builds it if leader.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.generation == generation:
+                self._entries.move_to_end(key)
+                return entry, None, False
+
+            flight = self._flights.get(key)
+            if flight is not None and flight.generation == generation:
+                return entry, flight, False
+
+            flight = self._flights[key] = self.flight_class(generation)
+            return None, flight, True
+
+    def _finish(self, key, flight, entry=None, error=None):
+        with self._lock:
+            # A newer generation's rebuild may have started meanwhile; it
+            # stores its own entry
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+                if entry is not None:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        flight.finish(entry, error)
+
+    def get(self, key, generation, build):
+        """Cached response for key at generation; build() returns the body bytes"""
+        entry, flight, leader = self._begin(key, generation)
+        if entry is not None:
+            return entry
+        if not leader:
+            return flight.wait()
+
+        try:
+            entry = CachedResponse(generation, build())
+        except BaseException as e:  # incl. cancellation: waiters must not hang
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, entry)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class AsyncResponseCache(ResponseCache):
+    """ResponseCache for coroutines: build() is awaited and waiters don't block the loop"""
+
+    flight_class = AsyncFlight
+
+    async def get(self, key, generation, build):
+        entry, flight, leader = self._begin(key, generation)
+        if entry is not None:
+            return entry
+        if not leader:
+            return await flight.wait()
+
+        try:
+            entry = CachedResponse(generation, await build())
+        except BaseException as e:  # incl. cancellation: waiters must not hang
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, entry)
+        return entry
@@ -0,0 +1,251 @@
+"""
+Scoring math shared by compute_scores.py and the API.
+
+Pure functions only (no database access), so both the batch scorer and
+request handlers can import them without circular imports.
+"""
+import math
+import statistics
+
+import numpy as np
+
+
+def normal_cdf(z):
+    """Standard normal cumulative distribution function"""
+    return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+
+# Define which metrics should be normalized by turnover (absolute values)
+# Percentages and ratios should NOT be normalized
+ABSOLUTE_METRICS = {
+    1,  # Operational_energy (MWh/Year)
+    3,  # C02_emissions_yearly (tCO2e)
+    6,  # Shipping_emmisions (tCO2e/km) - already normalized, keep as is
+    9,  # food_waste (Tonne/year)
+    10,  # Water_use (cubic m/year)
+    13,  # shipping_distance (km)
+    14,  # Energy_intensity (MWh/tonne) - already intensity, keep as is
+    15,  # waste_landfill (tonne.year)
+    17,  # Air_pollutant_emmisions (kg/year)
+    18,  # Embedded_carbon_per_project (tCO2e/proj) - already normalized
+}
+
+
+def normalize_value(metric_id, value, company_turnover):
+    """
+    Normalize metric value by log(turnover) for absolute metrics.
+    """
+    if metric_id in ABSOLUTE_METRICS and company_turnover and company_turnover > 0:
+        # Convert billions to millions for more reasonable log values
+        turnover_millions = company_turnover * 1000
+        # Use log base 10 + 1 to avoid log(0)
+        log_scale = math.log10(turnover_millions + 1)
+        # Return value normalized by log of turnover
+        return value / log_scale
+    else:
+        # Return raw value for percentages
+        return value
+
+
+def compute_metric_score(company_value, comparison_values, invert_score=False):
+    """
+    Compute 0-100 score for a metric value relative to comparison set.
+
+    Args:
+        company_value: The company's (normalized) value for this metric
+        comparison_values: List of all (normalized) values to compare against
+        invert_score: If FALSE, higher is better. If TRUE, lower is better.
+
+    Returns:
+        Score from 0-100, where 50 is average
+    """
+    # Handle empty comparison data
+    if not comparison_values or all(v is None for v in comparison_values):
+        return 50.0
+
+    # Convert to float and filter None
+    vals = [float(v) for v in comparison_values if v is not None]
+
+    if len(vals) == 0:
+        return 50.0
+
+    mean = statistics.mean(vals)
+
+    # Use standard deviation
+    if len(vals) > 1:
+        std = statistics.stdev(vals)
+    else:
+        std = 0.0
+
+    # If all values are identical, return 50
+    if std == 0.0:
+        return 50.0
+
+    # Calculate z-score
+    z = (company_value - mean) / std
+
+    # Apply inversion
+    # invert_score=FALSE: higher is better (renewable %, recycling %)
+    # invert_score=TRUE: lower is better (emissions, waste)
+    if invert_score:
+        z = -z  # Flip so lower values get higher scores
+
+    # Convert z-score to 0-100 scale using normal CDF
+    score = normal_cdf(z) * 100.0
+
+    # Clamp to 0-100 range
+    return max(0.0, min(100.0, score))
+
+
+def z_scores(company_values, comparison_values):
+    """
+    z-score of every value in `company_values` against the same comparison
+    set (sample stdev), computing its mean/stdev only once. NaN where no
+    z-score exists: fewer than 2 comparison values, or all of them equal.
+    """
+    company_values = np.asarray(company_values, dtype=float)
+    vals = np.asarray([v for v in comparison_values if v is not None], dtype=float)
+
+    if len(vals) < 2:
+        return np.full(company_values.shape, np.nan)
+
+    mean = statistics.mean(vals.tolist())
+    std = statistics.stdev(vals.tolist(), mean)
+
+    if std == 0.0:
+        return np.full(company_values.shape, np.nan)
+
+    return (company_values - mean) / std
+
+
+def scores_from_z(z, invert_score=False):
+    """0-100 scores for an array of z-scores; NaN (no z-score) scores 50"""
+    z = np.asarray(z, dtype=float)
+    if invert_score:
+        z = -z
+
+    scores = np.array([50.0 if np.isnan(v) else normal_cdf(v) * 100.0 for v in z.ravel()]).reshape(z.shape)
+    return np.clip(scores, 0.0, 100.0)
+
+
+def compute_metric_scores(company_values, comparison_values, invert_score=False):
+    """
+    Vectorized compute_metric_score: score every value in `company_values`
+    against the same comparison set, computing its mean/stdev only once.
+
+    Returns a numpy array of 0-100 scores (same length as company_values).
+    """
+    return scores_from_z(z_scores(company_values, comparison_values), invert_score)
+
+
+def percentile_scores(company_values, sorted_values, invert_score=False):
+    """
+    Empirical percentile rank (0-100) of each value within a comparison set,
+    found by binary search in the ascending `sorted_values`.
+
+    Ties count half: a value scores the share of comparison values below it
+    plus half the share equal to it, so identical values score identically and
+    an all-equal set scores 50. With invert_score the share ABOVE it is used.
+    Makes no assumption about the shape of the distribution.
+    """
+    company_values = np.asarray(company_values, dtype=float)
+    sorted_values = np.asarray(sorted_values, dtype=float)
+    n = len(sorted_values)
+
+    if n < 2:
+        return np.full(company_values.shape, 50.0)
+
+    below = np.searchsorted(sorted_values, company_values, side='left')
+    above = n - np.searchsorted(sorted_values, company_values, side='right')
+    equal = n - below - above
+    better = above if invert_score else below
+
+    return (better + 0.5 * equal) / n * 100.0
+
+
+def score_metric_values(company_values, comparison_values, invert_score=False, scoring_mode='zscore'):
+    """
+    Score values with the metric's scoring mode. Returns (scores, z-scores,
+    sorted comparison values or None). z-scores are NaN in percentile mode;
+    the sorted values are only built for percentile mode.
+    """
+    if scoring_mode == 'percentile':
+        sorted_values = np.sort(np.asarray([v for v in comparison_values if v is not None], dtype=float))
+        z = np.full(np.shape(company_values), np.nan)
+        return percentile_scores(company_values, sorted_values, invert_score), z, sorted_values
+
+    z = z_scores(company_values, comparison_values)
+    return scores_from_z(z, invert_score), z, None
+
+
+def weighted_profile_scores(metric_scores, weights):
+    """
+    Combine per-metric scores into one sector score per weighting profile.
+
+    Args:
+        metric_scores: (companies x metrics) array, NaN where a company has no score
+        weights: (metrics x profiles) array of weights
+
+    Returns:
+        (companies x profiles) array of weighted means over the metrics each
+        company has, NaN where the company's present weights sum to zero.
+    """
+    present = ~np.isnan(metric_scores)
+    weighted_sum = np.where(present, metric_scores, 0.0) @ weights
+    weight_sum_present = present.astype(float) @ weights
+
+    scores = np.full(weighted_sum.shape, np.nan)
+    has_weight = weight_sum_present > 0
+    scores[has_weight] = weighted_sum[has_weight] / weight_sum_present[has_weight]
+    return scores
+
+
+class RunningStats:
+    """
+    Count, mean and sample standard deviation accumulated in a single pass
+    (Welford's algorithm), so a comparison set never has to be held in memory.
+    """
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+def z_from_stats(company_value, stats):
+    """z-score against a RunningStats summary, or None where z_scores gives NaN"""
+    if stats is None or stats.count < 2:
+        return None
+
+    std = stats.stdev
+    if std == 0.0:
+        return None
+
+    return (company_value - stats.mean) / std
+
+
+def score_from_stats(company_value, stats, invert_score=False):
+    """
+    compute_metric_score against a RunningStats summary of the comparison set
+    instead of the values themselves.
+    """
+    z = z_from_stats(company_value, stats)
+    if z is None:
+        return 50.0
+
+    if invert_score:
+        z = -z
+
+    return max(0.0, min(100.0, normal_cdf(z) * 100.0))
@@ -0,0 +1,189 @@
+"""
+Monte Carlo weight-sensitivity analysis for GreenRank scores
+
+Samples thousands of perturbations of each sector's weights from a Dirichlet
+distribution centred on the configured sector_metrics weights, rescores every
+company for each sample and stores the distribution of its sector rank and
+overall (leaderboard) rank: median and 5th/95th percentiles.
+
+Per-metric scores do not depend on the weights, so they are computed once;
+each sample is then just a matrix product. Samples are split into batches and
+spread across a process pool.
+
+Usage:
+    python sensitivity.py
+    python sensitivity.py --samples 10000 --concentration 50 --workers 8
+
+A higher --concentration keeps sampled weights closer to the configured ones.
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from models import db, RankSensitivity
+from scoring import weighted_profile_scores
+
+# Set in each worker process by _init_worker: [(metric_scores, base_weights), ...]
+_SECTORS = None
+
+
+def _init_worker(sectors):
+    global _SECTORS
+    _SECTORS = sectors
+
+
+def rank_columns(scores):
+    """
+    Rank each column of a (companies x samples) score matrix, 1 = highest.
+    Companies without a score (NaN) rank last.
+    """
+    filled = np.where(np.isnan(scores), -np.inf, scores)
+    order = np.argsort(-filled, axis=0, kind='stable')
+    ranks = np.empty(scores.shape, dtype=np.int32)
+    positions = np.broadcast_to(np.arange(1, scores.shape[0] + 1, dtype=np.int32)[:, None], scores.shape)
+    np.put_along_axis(ranks, order, positions, axis=0)
+    return ranks
+
+
+def sample_weights(rng, base_weights, n_samples, concentration):
+    """
+    Draw (metrics x samples) weights from a Dirichlet centred on base_weights.
+    Metrics with zero base weight stay at zero.
+    """
+    weights = np.zeros((len(base_weights), n_samples))
+    active = base_weights > 0
+    if active.any():
+        alpha = concentration * base_weights[active] / base_weights[active].sum()
+        weights[active] = rng.dirichlet(alpha, size=n_samples).T
+    return weights
+
+
+def rank_batch(n_samples, concentration, seed):
+    """
+    Score one batch of weight samples across all sectors.
+    Returns (sector_ranks, overall_ranks), each (companies x n_samples).
+    """
+    rng = np.random.default_rng(seed)
+
+    sector_scores = []
+    sector_ranks = []
+    for metric_scores, base_weights in _SECTORS:
+        weights = sample_weights(rng, base_weights, n_samples, concentration)
+        scores = weighted_profile_scores(metric_scores, weights)
+        sector_scores.append(scores)
+        sector_ranks.append(rank_columns(scores))
+
+    all_scores = np.vstack(sector_scores)
+    return np.vstack(sector_ranks), rank_columns(all_scores)
+
+
+def rank_summary(ranks):
+    """Median and 5th/95th percentile of each row, as integer ranks"""
+    return (
+        np.percentile(ranks, 50, axis=1, method='inverted_cdf').astype(int),
+        np.percentile(ranks, 5, axis=1, method='inverted_cdf').astype(int),
+        np.percentile(ranks, 95, axis=1, method='inverted_cdf').astype(int),
+    )
+
+
+def run_sensitivity(samples=5000, concentration=100.0, workers=None, batch_size=250, seed=0):
+    """Run the analysis and replace the stored rank distributions"""
+    from compute_scores import ScoringInputs
+
+    print("=" * 80)
+    print(f"WEIGHT SENSITIVITY ANALYSIS ({samples} samples, concentration {concentration})")
+    print("=" * 80)
+
+    start = time.perf_counter()
+    inputs = ScoringInputs()
+
+    # Per-metric scores are weight-independent: compute them once per sector
+    sectors = []
+    company_ids = []
+    scored = []
+    for sector in inputs.sectors:
+        if not inputs.sector_metrics[sector.id]:
+            continue
+        sector_company_ids = inputs.companies_in_sector(sector.id)
+        metric_scores, _ = inputs.sector_metric_scores(sector.id, sector_company_ids)
+        base_weights = inputs.weight_matrix(sector.id)[:, 0]
+        sectors.append((metric_scores, base_weights))
+        company_ids.extend(sector_company_ids)
+
+        # Companies without a base score have no meaningful rank
+        base_scores = weighted_profile_scores(metric_scores, base_weights[:, None])[:, 0]
+        scored.extend(~np.isnan(base_scores))
+        print(f"   Sector {sector.id:2d} ({sector.sector_name:20s}): {len(sector_company_ids):4d} companies, "
+              f"{len(base_weights):2d} metrics")
+
+    scored = np.array(scored, dtype=bool)
+    print(f"\nLoaded inputs in {time.perf_counter() - start:.2f}s")
+
+    batch_sizes = [batch_size] * (samples // batch_size)
+    if samples % batch_size:
+        batch_sizes.append(samples % batch_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(sectors,)) as pool:
+        batches = list(pool.map(rank_batch, batch_sizes, [concentration] * len(batch_sizes), seeds))
+    print(f"Scored {samples} samples in {len(batch_sizes)} batches in {time.perf_counter() - start:.2f}s")
+
+    sector_ranks = np.hstack([b[0] for b in batches])
+    overall_ranks = np.hstack([b[1] for b in batches])
+    sector_median, sector_p5, sector_p95 = rank_summary(sector_ranks)
+    overall_median, overall_p5, overall_p95 = rank_summary(overall_ranks)
+
+    # Save to database
+    RankSensitivity.query.delete()
+
+    computed_at = datetime.utcnow()
+    db.session.bulk_insert_mappings(RankSensitivity, [
+        {
+            'company_id': cid,
+            'samples': samples,
+            'concentration': concentration,
+            'sector_rank_median': int(sector_median[i]),
+            'sector_rank_p5': int(sector_p5[i]),
+            'sector_rank_p95': int(sector_p95[i]),
+            'overall_rank_median': int(overall_median[i]),
+            'overall_rank_p5': int(overall_p5[i]),
+            'overall_rank_p95': int(overall_p95[i]),
+            'computed_at': computed_at
+        }
+        for i, cid in enumerate(company_ids) if scored[i]
+    ])
+    db.session.commit()
+
+    print(f"Saved rank distributions for {int(scored.sum())} companies")
+
+    # Show the least stable overall ranks
+    spread = overall_p95 - overall_p5
+    print("\n MOST WEIGHT-SENSITIVE COMPANIES (overall rank 5th-95th percentile):")
+    print("-" * 80)
+    for i in [i for i in np.argsort(-spread, kind='stable') if scored[i]][:10]:
+        print(f"   Company {company_ids[i]:4d}: median {overall_median[i]:4d}, "
+              f"range {overall_p5[i]:4d}-{overall_p95[i]:4d}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description="Monte Carlo weight-sensitivity analysis")
+    parser.add_argument('--samples', type=int, default=5000)
+    parser.add_argument('--concentration', type=float, default=100.0,
+                        help="Dirichlet concentration; higher = closer to configured weights")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--batch-size', type=int, default=250)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app({'DB_STATEMENT_TIMEOUT_MS': 0})  # batch job: no API statement timeout
+    with app.app_context():
+        run_sensitivity(args.samples, args.concentration, args.workers, args.batch_size, args.seed)
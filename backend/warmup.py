@@ -0,0 +1,137 @@
+"""
+Startup warm-up for an API process
+
+A fresh worker would otherwise make its first users pay for configuring the
+ORM mappers, opening database connections, loading the reference-data cache
+and building the leaderboard responses. Warmup does all of that up front, in
+a background thread, timing each step; GET /api/ready returns 503 until it
+has finished, so a load balancer only routes traffic to warm processes.
+
+The server entry points (python app.py, asgi.py) start it; under other WSGI
+servers the first /api/ready probe does. A failed warm-up is retried on the
+next probe. asgi.py adds a step that fills its own response cache, which
+serves the leaderboards in that mode.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.orm import configure_mappers
+
+from models import db, reference_data
+
+logger = logging.getLogger(__name__)
+
+# Responses cached during warm-up (besides every sector leaderboard): the
+# dashboard's first paint and the frontend leaderboard's request
+HOT_URLS = [
+    '/api/bootstrap',
+    '/api/leaderboard',
+    '/api/leaderboard?fields=company_id,name,sector_name,sector_score',
+]
+
+
+def hot_urls():
+    """HOT_URLS plus every sector leaderboard (call inside an app context)"""
+    return HOT_URLS + [f'/api/sectors/{sector_id}/leaderboard' for sector_id in reference_data().sectors]
+
+
+def open_pool_connections(engine):
+    """
+    Open as many connections as the pool keeps (pool_size) and return them to
+    it, so the first requests don't each pay for a connect. Returns the count.
+    """
+    size = getattr(engine.pool, 'size', None)
+    count = size() if callable(size) else 1
+
+    connections = []
+    try:
+        for _ in range(count):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text('SELECT 1'))
+    finally:
+        for conn in connections:
+            conn.close()
+    return count
+
+
+class Warmup:
+    """Warm-up state of one app: pending, running, ready or failed"""
+
+    def __init__(self, app, import_seconds=None):
+        self.app = app
+        self.import_seconds = import_seconds
+        self.status = 'pending'
+        self.steps = []
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.extra_steps = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Run the warm-up in a background thread, unless it is running or done"""
+        with self._lock:
+            if self.status in ('running', 'ready'):
+                return
+            self.status = 'running'  # error keeps the last failure while retrying
+            self.steps = []
+
+        threading.Thread(target=self.run, name='greenrank-warmup', daemon=True).start()
+
+    def add_step(self, name, func):
+        """Run func() as a timed step after the built-in ones"""
+        self.extra_steps.append((name, func))
+
+    def step(self, name, func):
+        started = time.perf_counter()
+        detail = func()
+        ms = (time.perf_counter() - started) * 1000
+        self.steps.append({'step': name, 'ms': round(ms, 1), 'detail': detail})
+        logger.info(f"Warm-up: {name} in {ms:.1f} ms" + (f" ({detail})" if detail is not None else ""))
+
+    def run(self):
+        self.started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                self.step('mappers', configure_mappers)
+                self.step('connection_pool', lambda: open_pool_connections(db.engine))
+                self.step('reference_data', lambda: len(reference_data().sectors))
+                self.step('responses', self.warm_responses)
+                for name, func in self.extra_steps:
+                    self.step(name, func)
+            self.status = 'ready'
+            self.error = None
+            logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.1f} ms")
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
+            logger.error(f"Warm-up failed: {e}")
+        finally:
+            self.finished_at = datetime.utcnow()
+
+    def warm_responses(self):
+        """Request the hot endpoints in-process so their responses are cached. Returns the count."""
+        urls = hot_urls()
+
+        client = self.app.test_client()
+        for url in urls:
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return len(urls)
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'import_ms': round(self.import_seconds * 1000, 1) if self.import_seconds is not None else None,
+            'steps': list(self.steps),
+            'total_ms': round(sum(s['ms'] for s in self.steps), 1),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'error': self.error
+        }
@@ -125,7 +125,9 @@ def main():
         'db/data/metrics.csv',
         'db/data/sector_metrics.csv',
         'db/data/companies.csv',
-        'db/data/company_metrics.csv'
+        'db/data/company_metrics.csv',
+        'db/data/weight_profiles.csv',
+        'db/data/profile_weights.csv'
     ]
     
     missing_files = [f for f in data_files if not os.path.exists(f)]
@@ -159,6 +161,8 @@ def main():
         ('sector_metrics', 'db/data/sector_metrics.csv', 'sector_metric_id,sector_id,metric_id,weight'),
         ('companies', 'db/data/companies.csv', 'company_id,name,sector_id,turnover,country,description,website'),
         ('company_metrics', 'db/data/company_metrics.csv', 'id,company_id,metric_id,value,year'),
+        ('weight_profiles', 'db/data/weight_profiles.csv', 'profile_id,profile_name,description'),
+        ('profile_weights', 'db/data/profile_weights.csv', 'profile_weight_id,profile_id,sector_id,metric_id,weight'),
     ]
     
     for table, file, columns in imports:
@@ -176,6 +180,13 @@ def main():
         "Fixing company_metrics sequence"
     )
     
+    # Running API processes reload sectors/metrics/weights when the 'reference'
+    # row changes, and rebuild cached responses when the 'companies' row does
+    run_psql(
+        "INSERT INTO cache_versions (name, version, updated_at) VALUES ('reference', 1, NOW()), ('companies', 1, NOW());",
+        "Invalidating API reference-data and response caches"
+    )
+    
     # Verify data
     print("\n" + "=" * 80)
     print("VERIFYING IMPORTED DATA")
@@ -187,6 +198,7 @@ def main():
         ("SELECT 'Sector-Metrics: ' || COUNT(*) FROM sector_metrics", "Sector-Metrics"),
         ("SELECT 'Companies: ' || COUNT(*) FROM companies", "Companies"),
         ("SELECT 'Company Metrics: ' || COUNT(*) FROM company_metrics", "Company Metrics"),
+        ("SELECT 'Weight Profiles: ' || COUNT(*) FROM weight_profiles", "Weight Profiles"),
     ]
     
     print()
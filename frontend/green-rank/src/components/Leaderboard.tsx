@@ -9,6 +9,53 @@ type Company = {
     sector: string;
 };
 
+// Only request the columns the table renders; the API narrows its query to match
+type LeaderboardRow = {
+    company_id: number;
+    name: string;
+    sector_name: string;
+    sector_score: number | null;
+};
+
+const LEADERBOARD_URL = 'http://localhost:5000/api/leaderboard?fields=company_id,name,sector_name,sector_score';
+
+// Static copies written after each scoring run; the manifest names the current files
+const ARTIFACTS_URL = 'http://localhost:5000/artifacts';
+
+// Server-sent events: a `generation` event whenever a scoring run is published
+const EVENTS_URL = 'http://localhost:5000/api/events';
+
+type ArtifactManifest = {
+    run_id: number;
+    leaderboard: { path: string };
+};
+
+const fetchJson = (url: string) =>
+    fetch(url).then(response => {
+        if (!response.ok) {
+            throw new Error(`${url}: ${response.status}`);
+        }
+        return response.json();
+    });
+
+type Leaderboard = {
+    runId: number | null;
+    rows: LeaderboardRow[];
+};
+
+// Prefer the static leaderboard artifact; fall back to the API if it hasn't
+// been built, or is older than the run we've been told about
+const fetchLeaderboard = (expectedRun: number | null): Promise<Leaderboard> =>
+    fetchJson(`${ARTIFACTS_URL}/manifest.json`)
+        .then((manifest: ArtifactManifest) => {
+            if (expectedRun !== null && manifest.run_id < expectedRun) {
+                throw new Error('Artifacts not built for the latest run yet');
+            }
+            return fetchJson(`${ARTIFACTS_URL}/${manifest.leaderboard.path}`)
+                .then((rows: LeaderboardRow[]) => ({ runId: manifest.run_id, rows }));
+        })
+        .catch(() => fetchJson(LEADERBOARD_URL).then((rows: LeaderboardRow[]) => ({ runId: expectedRun, rows })));
+
 function CompanyList() {
     const [companies, setCompanies] = useState<Company[]>([]);
     const [loading, setLoading] = useState(true);
@@ -16,17 +63,52 @@ function CompanyList() {
     const [isModalVisible, setModalVisible] = useState(false);
 
     useEffect(() => {
-        fetch('http://localhost:5000/api/companies')
-            .then(response => response.json())
-            .then(data => {
-                const sortedCompanies = data.sort((a: Company, b: Company) => b.sustainability_score - a.sustainability_score);
-                setCompanies(sortedCompanies);
-                setLoading(false);
-            })
-            .catch(error => {
-                console.error('Error fetching companies:', error);
-                setLoading(false);
-            });
+        // Scoring run the displayed rows come from (null until known), the
+        // latest run the server has announced, and whether a load is running
+        let loadedRun: number | null = null;
+        let latestRun: number | null = null;
+        let inFlight = false;
+
+        const load = (expectedRun: number | null) => {
+            inFlight = true;
+            fetchLeaderboard(expectedRun)
+                .then(({ runId, rows }) => {
+                    inFlight = false;
+                    loadedRun = runId;
+                    // Rows arrive already ranked
+                    setCompanies(rows.map(row => ({
+                        id: row.company_id,
+                        name: row.name,
+                        sector: row.sector_name,
+                        sustainability_score: row.sector_score ?? 0,
+                    })));
+                    setLoading(false);
+
+                    // A run was announced while loading, or the rows' run is unknown
+                    if (latestRun !== null && latestRun !== loadedRun) {
+                        load(latestRun);
+                    }
+                })
+                .catch(error => {
+                    inFlight = false;
+                    console.error('Error fetching companies:', error);
+                    setLoading(false);
+                });
+        };
+
+        load(null);
+
+        // Refetch only when a new scoring run is published, instead of polling
+        const events = new EventSource(EVENTS_URL);
+        events.addEventListener('generation', event => {
+            latestRun = JSON.parse((event as MessageEvent).data).run_id;
+            // A load in flight checks latestRun when it resolves
+            if (!inFlight && latestRun !== loadedRun) {
+                load(latestRun);
+            }
+        });
+
+        return () => events.close();
     }, []);
 
     const handleRowClick = (company: Company) => {